@@ -0,0 +1,529 @@
+"""
+Offline benchmark for podcast_generator.py
+
+Runs the full build_podcast -> generate_segments_and_combine -> combine_audio_segments
+flow without touching the real APIs:
+- ElevenLabs is replaced by a local HTTP server that answers with canned audio
+  after a random delay and sometimes with a 429
+- Gemini is replaced by an in-process fake model that streams outline and
+  dialogue JSON at a configurable speed
+
+Every episode runs in its own process and working directory, so peak RSS and
+CPU are measured per episode.
+
+Usage:
+    python benchmark.py                          # 10/30/60/90 minute episodes
+    python benchmark.py --minutes 10 --episodes 5
+    python benchmark.py --output bench.json      # save results
+    python benchmark.py --baseline bench.json    # fail if slower than a saved run
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import base64
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ==========================
+# CONFIG
+# ==========================
+DEFAULT_MINUTES = [10, 30, 60, 90]  # Commute lengths to benchmark
+DEFAULT_EPISODES = 3  # Episodes per commute length
+
+# Fake ElevenLabs
+TTS_LATENCY = (0.4, 1.2)  # Median and p95 response time in seconds
+TTS_RATE_LIMIT_PROBABILITY = 0.02  # Share of requests answered with 429
+TTS_RETRY_AFTER = 1  # Retry-After header sent with each 429
+SPEECH_WORDS_PER_MINUTE = 155  # Length of the canned audio returned per word
+
+# Fake Gemini
+LLM_FIRST_CHUNK_LATENCY = (0.8, 2.5)  # Median and p95 time to the first chunk in seconds
+LLM_CHARS_PER_SECOND = 600  # Streaming speed after the first chunk
+LLM_CHUNK_CHARS = 40  # Characters per streamed chunk
+
+# Regression gate: allowed change before a metric counts as a regression
+DEFAULT_TOLERANCE = 0.15
+
+FILLER_WORDS = (
+    "the idea is that we can look at how this works in practice and why it matters "
+    "for people who deal with it every day so here is a simple example to start with"
+).split()
+
+# ==========================
+# RANDOM LATENCY
+# ==========================
+def lognormal_delay(rng, median, p95):
+    """Random delay with the given median and 95th percentile (log-normal)"""
+    if median <= 0:
+        return 0.0
+    sigma = math.log(max(p95, median) / median) / 1.645
+    return rng.lognormvariate(math.log(median), sigma)
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+# ==========================
+# CANNED AUDIO
+# ==========================
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono, no CRC
+MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+MP3_FRAME_BYTES = 417  # 144 * 128000 / 44100
+MP3_FRAME_SECONDS = 1152 / 44100
+
+def silent_mp3(seconds):
+    """
+    MP3 audio of the given length made of silent frames.
+    Zeroed side information decodes as silence, so no encoder is needed.
+    """
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_BYTES - len(MP3_FRAME_HEADER))
+    return frame * max(1, math.ceil(seconds / MP3_FRAME_SECONDS))
+
+def silent_pcm(seconds, sample_rate):
+    """Raw 16-bit mono silence, as returned for "pcm_<rate>" output formats"""
+    return bytes(int(seconds * sample_rate) * 2)
+
+def speech_seconds(text):
+    return len(text.split()) * 60 / SPEECH_WORDS_PER_MINUTE
+
+# ==========================
+# FAKE ELEVENLABS SERVER
+# ==========================
+class FakeTTSServer:
+    """
+    Local stand-in for the ElevenLabs text-to-speech endpoints.
+    Point podcast_generator at .url with configure(elevenlabs_api_url=...) to use it.
+    """
+
+    def __init__(self, latency=TTS_LATENCY, rate_limit_probability=TTS_RATE_LIMIT_PROBABILITY,
+                 retry_after=TTS_RETRY_AFTER, audio_file=None, seed=None):
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.canned_audio = None
+        if audio_file:
+            with open(audio_file, "rb") as f:
+                self.canned_audio = f.read()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-tts", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _draw(self):
+        """Pick this request's delay and whether it gets a 429"""
+        with self.lock:
+            self.requests += 1
+            delay = lognormal_delay(self.rng, *self.latency)
+            limited = self.rng.random() < self.rate_limit_probability
+            if limited:
+                self.rate_limited += 1
+        return delay, limited
+
+    def _audio_for(self, text, output_format):
+        codec, _, rate = output_format.partition("_")
+        if codec == "pcm":
+            return silent_pcm(speech_seconds(text), int(rate or 24000))
+        if self.canned_audio is not None:
+            return self.canned_audio
+        return silent_mp3(speech_seconds(text))
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    payload = {}
+                url = urlsplit(self.path)
+                output_format = parse_qs(url.query).get("output_format", ["mp3_44100_128"])[0]
+                if not url.path.startswith("/v1/text-to-speech/"):
+                    self._send(404, b'{"detail": "not found"}', "application/json")
+                    return
+
+                delay, limited = server._draw()
+                time.sleep(delay)
+                if limited:
+                    self._send(429, b'{"detail": "rate limited"}', "application/json",
+                               {"Retry-After": str(server.retry_after)})
+                    return
+
+                text = payload.get("text", "")
+                audio = server._audio_for(text, output_format)
+                if url.path.endswith("/with-timestamps"):
+                    # Spread the characters evenly over the audio
+                    step = speech_seconds(text) / max(1, len(text))
+                    body = json.dumps({
+                        "audio_base64": base64.b64encode(audio).decode("ascii"),
+                        "alignment": {
+                            "characters": list(text),
+                            "character_start_times_seconds": [k * step for k in range(len(text))],
+                            "character_end_times_seconds": [(k + 1) * step for k in range(len(text))]
+                        }
+                    }).encode("utf-8")
+                    self._send(200, body, "application/json")
+                else:
+                    self._send(200, audio, "audio/mpeg")
+
+        return Handler
+
+# ==========================
+# FAKE GEMINI MODEL
+# ==========================
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    """
+    In-process stand-in for genai.GenerativeModel.
+    Answers outline prompts with an outline of the requested number of segments
+    and segment prompts with dialogue of about the requested number of words.
+    """
+
+    def __init__(self, first_chunk_latency=LLM_FIRST_CHUNK_LATENCY,
+                 chars_per_second=LLM_CHARS_PER_SECOND, chunk_chars=LLM_CHUNK_CHARS, seed=None):
+        self.first_chunk_latency = first_chunk_latency
+        self.chars_per_second = chars_per_second
+        self.chunk_chars = chunk_chars
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def _outline(self, num_segments):
+        return json.dumps([
+            {
+                "segment": i,
+                "title": f"Part {i}",
+                "learning_goal": f"Understand part {i}",
+                "key_points": [f"Point {i}.1", f"Point {i}.2"],
+                "summary": f"Covers part {i} of the topic.",
+                "transition": f"Leads into part {i + 1}."
+            }
+            for i in range(1, num_segments + 1)
+        ], indent=2)
+
+    def _words(self, count):
+        with self.lock:
+            start = self.rng.randrange(len(FILLER_WORDS))
+        words = [FILLER_WORDS[(start + k) % len(FILLER_WORDS)] for k in range(count)]
+        return " ".join(words).capitalize() + "."
+
+    def _dialogue(self, target_words):
+        lines = []
+        words = 0
+        while words < target_words:
+            # Short host questions, long expert answers (about 10% / 90%)
+            host = self._words(8)
+            expert = self._words(min(70, max(10, target_words - words - 8)))
+            lines.append({"speaker": "HOST", "text": host})
+            lines.append({"speaker": "EXPERT", "text": expert})
+            words += len(host.split()) + len(expert.split())
+        return json.dumps(lines, indent=2)
+
+    def _respond(self, prompt):
+        segments = re.search(r"split into (\d+) internal segments", prompt)
+        if segments:
+            return self._outline(int(segments.group(1)))
+        target = re.search(r"Approximately (\d+) words", prompt)
+        return self._dialogue(int(target.group(1)) if target else 600)
+
+    def _stream(self, text):
+        with self.lock:
+            first_delay = lognormal_delay(self.rng, *self.first_chunk_latency)
+        time.sleep(first_delay)
+        for start in range(0, len(text), self.chunk_chars):
+            chunk = text[start:start + self.chunk_chars]
+            yield _Chunk(chunk)
+            time.sleep(len(chunk) / self.chars_per_second)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        text = self._respond(prompt)
+        if stream:
+            return self._stream(text)
+        with self.lock:
+            delay = lognormal_delay(self.rng, *self.first_chunk_latency)
+        time.sleep(delay + len(text) / self.chars_per_second)
+        return _Chunk(text)
+
+# ==========================
+# SINGLE EPISODE (child process)
+# ==========================
+def run_episode(job):
+    """Generate one episode against the fakes and write its metrics report to job['result']"""
+    workdir = tempfile.mkdtemp(prefix="podcast_bench_")
+    os.chdir(workdir)
+    sys.path.insert(0, SCRIPT_DIR)
+    import podcast_generator as pg
+
+    fake_model = FakeModel(tuple(job["llm_latency"]), job["llm_chars_per_second"], seed=job["seed"])
+    pg.configure(elevenlabs_api_url=job["tts_url"], model_factory=lambda *args: fake_model)
+
+    start = time.perf_counter()
+    output = contextlib.nullcontext() if job["verbose"] else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with output:
+        try:
+            prompts = pg.build_podcast(job["topic"], job["minutes"], resume=False, fresh=True)
+            segment_files = pg.generate_segments_and_combine(
+                job["topic"], prompts, use_cache=False, resume=False, fresh=True
+            )
+            ok = bool(segment_files) and os.path.exists("output/podcast_full.mp3")
+        except Exception as e:
+            print(f"❌ Episode failed: {e}", file=sys.stderr)
+            ok = False
+    report = pg.metrics.report()
+    report["ok"] = ok
+    report["episode_seconds"] = time.perf_counter() - start
+
+    with open(job["result"], "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    os.chdir(SCRIPT_DIR)
+    if not job["keep"]:
+        shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        print(f"📁 Episode output kept in {workdir}", file=sys.stderr)
+
+def spawn_episode(job):
+    """Run one episode in a fresh interpreter and return its metrics report"""
+    fd, job["result"] = tempfile.mkstemp(prefix="podcast_bench_", suffix=".json")
+    os.close(fd)
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(job)],
+                       check=False)
+        with open(job["result"], "r", encoding="utf-8") as f:
+            content = f.read()
+        return json.loads(content) if content else {"ok": False}
+    finally:
+        os.remove(job["result"])
+
+# ==========================
+# BENCHMARK
+# ==========================
+def summarize(minutes, reports, wall_seconds):
+    """Aggregate the reports of all episodes of one length"""
+    ok = [r for r in reports if r.get("ok")]
+    first_audio = [r["marks"]["first_audio"] for r in ok if "first_audio" in r.get("marks", {})]
+    stages = {}
+    for r in ok:
+        for stage, span in r["stages"].items():
+            totals = stages.setdefault(stage, {"seconds": 0.0, "cpu_seconds": 0.0})
+            totals["seconds"] += span["seconds"] / len(ok)
+            totals["cpu_seconds"] += span["cpu_seconds"] / len(ok)
+
+    def mean(values):
+        return sum(values) / len(values) if values else None
+
+    return {
+        "minutes": minutes,
+        "episodes": len(reports),
+        "failed": len(reports) - len(ok),
+        "wall_seconds": round(wall_seconds, 2),
+        "episodes_per_hour": round(len(ok) * 3600 / wall_seconds, 2) if wall_seconds else None,
+        "episode_seconds_p50": percentile([r["episode_seconds"] for r in ok], 50),
+        "first_audio_p50": percentile(first_audio, 50),
+        "first_audio_p95": percentile(first_audio, 95),
+        "peak_rss_kb": max((r["process"].get("peak_rss_kb", 0) for r in ok), default=None),
+        "cpu_seconds": {
+            "process": mean([r["process"]["cpu_seconds"]["python"] for r in ok]),
+            "children": mean([r["process"]["cpu_seconds"]["children"] for r in ok])
+        },
+        "stages": {stage: {key: round(value, 4) for key, value in totals.items()}
+                   for stage, totals in sorted(stages.items())},
+        "tts_requests": mean([r["counters"].get("tts_requests", 0) for r in ok]),
+        "tts_rate_limited": mean([r["counters"].get("tts_rate_limited", 0) for r in ok])
+    }
+
+def run_benchmark(minutes_list, episodes, concurrency, tts_server, args):
+    results = []
+    for minutes in minutes_list:
+        print(f"\n⏱️  {minutes}-minute episodes: running {episodes} "
+              f"({concurrency} at a time)...")
+        jobs = [{
+            "topic": f"Benchmark topic {minutes}-{n}",
+            "minutes": minutes,
+            "tts_url": tts_server.url,
+            "llm_latency": args.llm_latency,
+            "llm_chars_per_second": args.llm_chars_per_second,
+            "seed": None if args.seed is None else args.seed + n,
+            "verbose": args.verbose,
+            "keep": args.keep
+        } for n in range(episodes)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            reports = list(executor.map(spawn_episode, jobs))
+        summary = summarize(minutes, reports, time.perf_counter() - start)
+        results.append(summary)
+        print_summary(summary)
+    return results
+
+def _fmt(value, unit="", digits=2):
+    return "n/a" if value is None else f"{value:.{digits}f}{unit}"
+
+def print_summary(summary):
+    print(f"  ✅ {summary['episodes'] - summary['failed']}/{summary['episodes']} episodes "
+          f"in {summary['wall_seconds']:.1f}s")
+    print(f"  📈 Episodes/hour: {_fmt(summary['episodes_per_hour'])}")
+    print(f"  🎧 Time to first audio: p50 {_fmt(summary['first_audio_p50'], 's')}, "
+          f"p95 {_fmt(summary['first_audio_p95'], 's')}")
+    rss = summary["peak_rss_kb"]
+    print(f"  🧠 Peak RSS: {_fmt(rss / 1024 if rss else None, ' MB', 1)}")
+    cpu = summary["cpu_seconds"]
+    print(f"  🖥️  CPU per episode: {_fmt(cpu['process'], 's')} python, "
+          f"{_fmt(cpu['children'], 's')} ffmpeg")
+    for stage, totals in summary["stages"].items():
+        print(f"     {stage:<20} {totals['seconds']:>9.2f}s wall {totals['cpu_seconds']:>8.2f}s cpu")
+
+# ==========================
+# REGRESSION GATE
+# ==========================
+# Metric name -> True if higher is better
+GATED_METRICS = {
+    "episodes_per_hour": True,
+    "first_audio_p95": False,
+    "peak_rss_kb": False
+}
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of regressions against a saved benchmark run"""
+    previous = {entry["minutes"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for summary in results:
+        old = previous.get(summary["minutes"])
+        if not old:
+            continue
+        if summary["failed"] > old.get("failed", 0):
+            regressions.append(f"{summary['minutes']} min: {summary['failed']} failed episodes")
+        for metric, higher_is_better in GATED_METRICS.items():
+            new_value, old_value = summary.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"{summary['minutes']} min: {metric} "
+                                   f"{old_value:.2f} -> {new_value:.2f} ({change:+.0%})")
+    return regressions
+
+# ==========================
+# MAIN
+# ==========================
+def parse_latency(value):
+    """'MEDIAN,P95' in seconds"""
+    median, _, p95 = value.partition(",")
+    return (float(median), float(p95 or median))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark podcast_generator.py against local fakes")
+    parser.add_argument("--minutes", type=int, nargs="+", default=DEFAULT_MINUTES,
+                        help="episode lengths in minutes")
+    parser.add_argument("--episodes", type=int, default=DEFAULT_EPISODES,
+                        help="episodes per length")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="episodes generated at the same time")
+    parser.add_argument("--tts-latency", type=parse_latency, default=TTS_LATENCY,
+                        metavar="MEDIAN,P95", help="fake TTS response time in seconds")
+    parser.add_argument("--rate-limit-probability", type=float, default=TTS_RATE_LIMIT_PROBABILITY,
+                        help="share of TTS requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=TTS_RETRY_AFTER,
+                        help="Retry-After seconds sent with each 429")
+    parser.add_argument("--audio", help="return this audio file for every MP3 TTS request "
+                                        "instead of generated silence")
+    parser.add_argument("--llm-latency", type=parse_latency, default=LLM_FIRST_CHUNK_LATENCY,
+                        metavar="MEDIAN,P95", help="fake LLM time to first chunk in seconds")
+    parser.add_argument("--llm-chars-per-second", type=float, default=LLM_CHARS_PER_SECOND,
+                        help="fake LLM streaming speed")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable runs")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a results file and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative change before a metric counts as a regression")
+    parser.add_argument("--keep", action="store_true", help="keep each episode's output directory")
+    parser.add_argument("--verbose", action="store_true", help="show the generator's output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_episode(json.loads(args.child))
+        return 0
+
+    print("🏁 Podcast generator benchmark (offline)")
+    tts_server = FakeTTSServer(args.tts_latency, args.rate_limit_probability, args.retry_after,
+                               args.audio, args.seed).start()
+    print(f"🔌 Fake TTS server: {tts_server.url}")
+    try:
+        results = run_benchmark(args.minutes, args.episodes, max(1, args.concurrency),
+                                tts_server, args)
+    finally:
+        tts_server.stop()
+    print(f"\n🔢 Fake TTS server: {tts_server.requests} requests, {tts_server.rate_limited} answered 429")
+
+    settings = {key: value for key, value in vars(args).items()
+                if key not in ("child", "output", "baseline", "keep", "verbose")}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+        print(f"💾 Results saved: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            return 1
+        print(f"\n✅ No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
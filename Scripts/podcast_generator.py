@@ -1,59 +1,705 @@
 import os
+import re
 import json
+import uuid
+import argparse
 import math
+import random
+import base64
+import hashlib
 import time
 import shutil
-import requests
-import google.generativeai as genai
+import queue
+import functools
+import subprocess
+import threading
+import importlib.util
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+
+# requests, google.generativeai, pydub and http.server are imported on first use,
+# so importing this module (e.g. just for the prompt builders or parsers) stays fast
 
 # Optional: For combining audio files (install with: pip install pydub)
-try:
-    from pydub import AudioSegment
-    from pydub.utils import which
-    PYDUB_AVAILABLE = True
-except ImportError:
-    PYDUB_AVAILABLE = False
+PYDUB_AVAILABLE = importlib.util.find_spec("pydub") is not None
 
 # ==========================
 # CONFIG
 # ==========================
-WORDS_PER_MINUTE = 155
+WORDS_PER_MINUTE = 155  # Used until the voices' pace has been measured (see PACE_FILE)
 SEGMENT_MINUTES = 4  # each segment ~4 minutes
 
+# Voices
+HOST_VOICE_ID = "21m00Tcm4TlvDq8ikWAM"  # Rachel (female)
+EXPERT_VOICE_ID = "29vD33N1CtxCmqQRPOHJ"  # Drew (male)
+
 # API Keys
+# The GEMINI_API_KEY and ELEVENLABS_API_KEY environment variables take precedence
 gemini_api_key = 'GEMINI_API_KEY'  # Add your Gemini API key here
 elevenlabs_api_key = 'ELEVENLABS_API_KEY'  # Add your ElevenLabs API key here
 
 # FFmpeg Configuration (if not in PATH)
-# Set this to the directory containing ffmpeg.exe and ffprobe.exe
+# Set this to the directory containing ffmpeg.exe and ffprobe.exe (or set FFMPEG_PATH in the environment)
 # Example: r"C:\ffmpeg\ffmpeg-master-latest-win64-gpl\bin"
 FFMPEG_PATH = None  # Set to your ffmpeg bin directory if ffmpeg is not in PATH
 
 # API Rate Limiting
-# Delay between API calls in seconds (increase if you hit rate limits)
-API_DELAY_SECONDS = 2  # Recommended: 1-3 seconds for free tier, 0.5-1 for paid tier
+# Average number of TTS requests started per second (token bucket refill rate).
+# The limiter backs off on its own when ElevenLabs answers 429, so this is a ceiling.
+TTS_REQUESTS_PER_SECOND = 2.0  # Recommended: 0.5 for free tier, 2-5 for paid tier
+TTS_BURST = 2  # Requests that may start back-to-back before throttling kicks in
+# Number of dialogue lines synthesized in parallel (1 = one line at a time)
+TTS_MAX_CONCURRENCY = 2  # ElevenLabs allows 2 concurrent requests on free tier; raise it on paid tiers
+
+# HTTP
+ELEVENLABS_API_URL = "https://api.elevenlabs.io/v1"
+HTTP_POOL_SIZE = 16  # Keep-alive connections per host; keep >= TTS_MAX_CONCURRENCY
+HTTP_CONNECT_TIMEOUT = 5  # Seconds to establish a connection
+HTTP_READ_TIMEOUT = 30  # Seconds to wait for the next bytes of a response
+
+# TTS Resilience
+TTS_MAX_RETRIES = 4  # Attempts per line before the segment is marked failed
+# With a rate limiter, 429s don't use up those attempts (the limiter slows down instead);
+# a line still fails after this many 429s
+TTS_MAX_RATE_LIMITED = 20
+# Retries wait a random time up to BASE * 2^attempt seconds (capped), or at least Retry-After
+TTS_BACKOFF_BASE = 1.0
+TTS_BACKOFF_MAX = 30.0
+# Send a duplicate request when the first one is slower than the recent p95 latency;
+# whichever answers first is used. Costs at most one extra request for the slowest ~5%.
+TTS_HEDGE_ENABLED = True
+TTS_HEDGE_MIN_SAMPLES = 20  # Latencies to observe before hedging starts
+TTS_HEDGE_MIN_DELAY = 2.0  # Never hedge sooner than this many seconds
+# Stop calling ElevenLabs for a while when most recent requests failed (5xx, timeouts)
+TTS_BREAKER_WINDOW = 20  # Recent requests the failure rate is computed over
+TTS_BREAKER_FAILURE_RATE = 0.5  # Open the breaker at this failure rate
+TTS_BREAKER_COOLDOWN = 30  # Seconds to fail fast before sending a trial request
+
+# Text-to-Speech
+TTS_MODEL_ID = "eleven_multilingual_v2"  # Or set ELEVENLABS_MODEL_ID in the environment
+TTS_VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75,
+    "style": 0.0,
+    "use_speaker_boost": True
+}
+# Line audio format requested from ElevenLabs. "pcm_<rate>" returns raw 16-bit mono
+# samples that are appended as-is and encoded once per segment; an "mp3_..." format
+# has to be decoded with ffmpeg for every line first.
+TTS_OUTPUT_FORMAT = "pcm_24000"  # Or e.g. "mp3_44100_128"
+
+# TTS Batching
+# Merge adjacent lines by the same speaker into one request of up to this many characters.
+# Fewer, larger requests mean fewer round trips and fewer joins. 0 = one request per line.
+TTS_BATCH_MAX_CHARS = 0  # Recommended: 800-1500 when enabled (ElevenLabs accepts up to ~5000)
+# Ask for character timings on merged requests so each line's start/end can be recovered
+TTS_BATCH_ALIGNMENT = True
+
+# Transcript
+# Every episode gets transcript.json (line start/end times) and transcript.vtt.
+# Word times are included for lines synthesized with character timings; set this to
+# request timings for every line (same price, ~30% larger responses).
+TTS_WORD_TIMINGS = False
+
+# TTS Chunking
+# Lines longer than this are split at sentence boundaries into requests of at most
+# this many characters, synthesized in parallel and joined with no pause.
+# Short requests have lower tail latency and a failed chunk is cheap to retry. 0 = off.
+TTS_CHUNK_MAX_CHARS = 350
+# Send the neighbouring chunks as previous_text/next_text so intonation carries across splits
+TTS_CHUNK_CONTEXT = True
+
+# TTS Cache
+# Lines with the same text, voice, model and voice settings are reused from disk
+TTS_CACHE_ENABLED = True  # Set to False to always call the API
+TTS_CACHE_DIR = "output/cache/tts"
+TTS_CACHE_MAX_BYTES = 500 * 1024 * 1024  # Least recently used entries are evicted above this
+
+# Pace Calibration
+# Speaking pace is measured per voice from the synthesized audio and kept here, so
+# episodes are planned from how fast the voices really talk rather than WORDS_PER_MINUTE
+PACE_FILE = "output/cache/pace.json"
+PACE_MIN_SECONDS = 120  # Audio measured for a voice before its pace is used
+PACE_HISTORY_SECONDS = 4 * 3600  # Older measurements fade out beyond this much audio per voice
+# The last segment's length is corrected when the earlier scripts ran long or short
+# by more than this share of the episode
+DURATION_TOLERANCE = 0.05
+
+# Audio Assembly
+# Line audio is decoded to PCM at this format and encoded once per segment
+AUDIO_SAMPLE_RATE = 44100  # Matches ElevenLabs' default mp3_44100_128 output
+AUDIO_CHANNELS = 1
+AUDIO_BITRATE = "128k"
+LINE_PAUSE_MS = 300  # Pause between dialogue lines
+
+# Delivery
+# Encoding of the segment files and the full episode. The speech profiles are mono
+# and a fraction of the MP3 size, which matters for downloads over cellular.
+# Ogg Opus plays on Android and the web but not in HLS or on older iOS versions.
+# "hls": segments can be published as HLS packed audio (see EpisodeStream).
+DELIVERY_PROFILE = "mp3"  # "mp3", "opus_speech" or "aac_speech"
+DELIVERY_PROFILES = {
+    "mp3": {
+        "codec": "libmp3lame", "format": "mp3", "extension": ".mp3", "mime_type": "audio/mpeg",
+        "bitrate": AUDIO_BITRATE, "sample_rate": AUDIO_SAMPLE_RATE, "hls": True,
+        # No Xing/Info frame or ID3 tag, so segment files can be joined frame by frame
+        # (the HLS timestamp tag added on publishing is skipped when joining)
+        "options": ["-write_xing", "0", "-id3v2_version", "0"]
+    },
+    "opus_speech": {
+        "codec": "libopus", "format": "ogg", "extension": ".ogg", "mime_type": "audio/ogg",
+        "bitrate": "32k", "sample_rate": 24000, "hls": False,
+        "options": ["-application", "voip"]
+    },
+    "aac_speech": {
+        # ADTS frames carry their own headers, so segments can be joined frame by frame
+        "codec": "aac", "format": "adts", "extension": ".aac", "mime_type": "audio/aac",
+        "bitrate": "48k", "sample_rate": 24000, "hls": True,
+        "options": []
+    }
+}
+
+# LLM Cache
+# Outline and script responses are reused when model, prompt and generation config match
+LLM_CACHE_ENABLED = True  # Set to False (or pass fresh=True) to always ask the model
+LLM_CACHE_DIR = "output/cache/llm"
+LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Regenerate content older than a week
+
+# Prompts
+# Send the segment writing guidelines as the model's system instruction instead of
+# repeating them inside every segment prompt. None = decide from the model name:
+# Gemini models take a system instruction, Gemma models reject one. Without it the
+# guidelines go first in each prompt, so all segment prompts share the same prefix.
+LLM_SYSTEM_INSTRUCTION = None
+# Earlier segments mentioned in each segment prompt: the last few with their learning
+# goal, older ones by title only, trimmed to a fixed size so long episodes don't
+# grow every prompt
+PROMPT_RECENT_SEGMENTS = 3
+PROMPT_EARLIER_MAX_CHARS = 600
+
+# Pipeline
+# How many segment scripts the LLM may write ahead of the segment being voiced
+SCRIPT_LOOKAHEAD = 2
+# Stream scripts from the LLM and start voicing each line as soon as it is written
+LLM_STREAMING = True
+
+# Topic Catalog
+# Episodes for the app's built-in topics are pre-generated into this store by
+# pregenerate_catalog.py. A request for a catalog topic and duration starts from
+# the stored outline, scripts and (if the delivery profile matches) segment audio.
+CATALOG_ENABLED = True  # fresh=True always skips the catalog
+CATALOG_DIR = "output/catalog"
+CATALOG_MINUTES = [15, 30, 45, 60]  # Durations pre-generated for every catalog topic
+
+# Service mode (python podcast_generator.py --serve)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_WORKERS = 2  # Episodes generated at the same time
+SERVICE_MAX_QUEUED = 50  # New jobs are refused with 503 beyond this many waiting jobs
+SERVICE_MAX_MINUTES = 180  # Longest episode a job may ask for
+SERVICE_JOBS_DIR = "output/jobs"  # One workspace folder per job
+# Finished jobs (and their folders) are dropped after SERVICE_JOB_TTL seconds, and the
+# oldest ones go early once more than SERVICE_MAX_FINISHED_JOBS are kept
+SERVICE_JOB_TTL = 24 * 60 * 60  # None keeps finished jobs until the limit below
+SERVICE_MAX_FINISHED_JOBS = 200
+
+LLM_MODEL_NAME = "gemma-3-1b-it"
+LLM_GENERATION_CONFIG = {}  # e.g. {"temperature": 0.9}; part of the LLM cache key
+
+
+def _gemini_model(model_name, generation_config=None, system_instruction=None):
+    import google.generativeai as genai
+    genai.configure(api_key=get_config().gemini_api_key)
+    return genai.GenerativeModel(model_name, generation_config=generation_config or None,
+                                 system_instruction=system_instruction)
+
+
+def _env(name, default):
+    """The environment variable name if it is set and not empty, otherwise default"""
+    return os.environ.get(name) or default
+
+
+@dataclass
+class GeneratorConfig:
+    """
+    Settings for keys, model, voices and tools, read when the config is created.
+    Keys, API URL, model names and ffmpeg path come from the environment (GEMINI_API_KEY,
+    ELEVENLABS_API_KEY, ELEVENLABS_API_URL, ELEVENLABS_MODEL_ID, LLM_MODEL_NAME,
+    FFMPEG_PATH) where set, otherwise from the constants above; pass overrides to
+    configure() instead of editing module globals.
+    model_factory(model_name, generation_config, system_instruction) builds the LLM client.
+    """
+    gemini_api_key: str = field(default_factory=lambda: _env("GEMINI_API_KEY", gemini_api_key))
+    elevenlabs_api_key: str = field(default_factory=lambda: _env("ELEVENLABS_API_KEY", elevenlabs_api_key))
+    elevenlabs_api_url: str = field(default_factory=lambda: _env("ELEVENLABS_API_URL", ELEVENLABS_API_URL))
+    tts_model_id: str = field(default_factory=lambda: _env("ELEVENLABS_MODEL_ID", TTS_MODEL_ID))
+    llm_model_name: str = field(default_factory=lambda: _env("LLM_MODEL_NAME", LLM_MODEL_NAME))
+    llm_generation_config: dict = field(default_factory=lambda: dict(LLM_GENERATION_CONFIG))
+    host_voice_id: str = HOST_VOICE_ID
+    expert_voice_id: str = EXPERT_VOICE_ID
+    ffmpeg_path: str = field(default_factory=lambda: _env("FFMPEG_PATH", FFMPEG_PATH))
+    model_factory: object = _gemini_model
+
+
+_config = GeneratorConfig()
+_models = {}
+_models_lock = threading.Lock()
+_audio_segment = None
+
+def get_config():
+    return _config
+
+def configure(config=None, **overrides):
+    """
+    Set the active configuration, e.g. configure(gemini_api_key="...", host_voice_id="...")
+    configure(GeneratorConfig()) reads the environment again.
+    Models and pydub are set up again from it on their next use.
+    """
+    global _config, _audio_segment
+    new_config = replace(config or _config, **overrides)
+    with _models_lock:
+        _config = new_config
+        _models.clear()
+        _audio_segment = None
+    return new_config
+
+def ffmpeg_binary(name="ffmpeg"):
+    """ffmpeg/ffprobe from the configured folder, otherwise whatever is on PATH"""
+    folder = get_config().ffmpeg_path
+    if folder:
+        return os.path.join(folder, name + (".exe" if os.name == "nt" else ""))
+    return shutil.which(name) or name
+
+def load_pydub():
+    """pydub's AudioSegment, imported and pointed at ffmpeg on first use"""
+    global _audio_segment
+    if _audio_segment is None:
+        from pydub import AudioSegment
+        # Configure pydub to use custom ffmpeg path if specified
+        if get_config().ffmpeg_path:
+            AudioSegment.converter = ffmpeg_binary("ffmpeg")
+            AudioSegment.ffmpeg = ffmpeg_binary("ffmpeg")
+            AudioSegment.ffprobe = ffmpeg_binary("ffprobe")
+        _audio_segment = AudioSegment
+    return _audio_segment
+
+# ==========================
+# METRICS
+# ==========================
+class Metrics:
+    """
+    Timing spans and counters for one generation job.
+    A span adds up wall time, the CPU time of the thread that ran it and the
+    number of calls for one stage. Stages run in parallel threads, so span
+    totals can add up to more than the job's wall time.
+    The "process" part of a report is read from the OS for the whole Python
+    process: when the service runs several jobs at once it includes the other
+    jobs, so only the span CPU times belong to this job alone.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.started_perf = time.perf_counter()
+            self.started_cpu = os.times()
+            self.spans = {}
+            self.counters = {}
+            self.marks = {}
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, time.thread_time() - start_cpu)
+
+    def observe(self, stage, seconds, cpu_seconds=0.0):
+        with self.lock:
+            span = self.spans.setdefault(stage, {
+                "count": 0, "seconds": 0.0, "cpu_seconds": 0.0, "max_seconds": 0.0
+            })
+            span["count"] += 1
+            span["seconds"] += seconds
+            span["cpu_seconds"] += cpu_seconds
+            span["max_seconds"] = max(span["max_seconds"], seconds)
+
+    def incr(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def mark(self, name):
+        """Record how long after the job started a milestone was first reached"""
+        elapsed = time.perf_counter() - self.started_perf
+        with self.lock:
+            self.marks.setdefault(name, elapsed)
+
+    def sleep(self, stage, seconds):
+        """time.sleep that is recorded as a span, for back-off and throttling waits"""
+        if seconds > 0:
+            time.sleep(seconds)
+            self.observe(stage, seconds)
+
+    def report(self):
+        now = os.times()
+        with self.lock:
+            report = {
+                "started_at": self.started,
+                "wall_seconds": round(time.perf_counter() - self.started_perf, 3),
+                # Process-wide, not per job: see the class docstring
+                "process": {
+                    "cpu_seconds": {
+                        "python": round((now.user - self.started_cpu.user)
+                                        + (now.system - self.started_cpu.system), 3),
+                        # ffmpeg and other subprocesses
+                        "children": round((now.children_user - self.started_cpu.children_user)
+                                          + (now.children_system - self.started_cpu.children_system), 3)
+                    }
+                },
+                "stages": {
+                    stage: {key: round(value, 4) if isinstance(value, float) else value
+                            for key, value in span.items()}
+                    for stage, span in sorted(self.spans.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+                "marks": {name: round(seconds, 3) for name, seconds in self.marks.items()}
+            }
+        try:
+            import resource
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            report["process"]["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError:
+            pass
+        return report
+
+    def to_prometheus(self, report=None):
+        """Render a report in the Prometheus text exposition format"""
+        report = report or self.report()
+        lines = [
+            "# HELP podcast_job_wall_seconds Wall time of the generation job",
+            "# TYPE podcast_job_wall_seconds gauge",
+            f"podcast_job_wall_seconds {report['wall_seconds']}",
+            "# HELP podcast_process_cpu_seconds CPU time of the whole process (all running jobs) since the job started",
+            "# TYPE podcast_process_cpu_seconds gauge"
+        ]
+        for process, seconds in report["process"]["cpu_seconds"].items():
+            lines.append(f'podcast_process_cpu_seconds{{process="{process}"}} {seconds}')
+
+        for metric, key, kind, help_text in (
+            ("podcast_stage_seconds_total", "seconds", "counter", "Wall time spent in each stage"),
+            ("podcast_stage_cpu_seconds_total", "cpu_seconds", "counter", "Thread CPU time spent in each stage"),
+            ("podcast_stage_calls_total", "count", "counter", "Number of times each stage ran"),
+            ("podcast_stage_max_seconds", "max_seconds", "gauge", "Slowest single run of each stage")
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for stage, span in report["stages"].items():
+                lines.append(f'{metric}{{stage="{stage}"}} {span[key]}')
+
+        if report["marks"]:
+            lines.append("# HELP podcast_job_mark_seconds Seconds from job start to each milestone")
+            lines.append("# TYPE podcast_job_mark_seconds gauge")
+            for name, seconds in report["marks"].items():
+                lines.append(f'podcast_job_mark_seconds{{mark="{name}"}} {seconds}')
+
+        for counter, value in report["counters"].items():
+            lines.append(f"# TYPE podcast_{counter}_total counter")
+            lines.append(f"podcast_{counter}_total {value}")
+
+        if "peak_rss_kb" in report["process"]:
+            lines.append("# HELP podcast_process_peak_rss_kilobytes Peak RSS of the whole process")
+            lines.append("# TYPE podcast_process_peak_rss_kilobytes gauge")
+            lines.append(f"podcast_process_peak_rss_kilobytes {report['process']['peak_rss_kb']}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, directory="output"):
+        """Write metrics.json and metrics.prom (Prometheus textfile format)"""
+        report = self.report()
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, "metrics.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        with open(os.path.join(directory, "metrics.prom"), "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(report))
+        return json_path
+
+
+# Process-wide metrics, used when no job has been bound to the current thread
+metrics = Metrics()
+_bound = threading.local()
+
+def current_metrics():
+    """Metrics of the job the current thread is working for"""
+    return getattr(_bound, "metrics", None) or metrics
+
+def _set_thread_metrics(job_metrics):
+    _bound.metrics = job_metrics
+
+@contextmanager
+def bind_metrics(job_metrics):
+    """Record metrics from this thread into job_metrics while the block runs"""
+    previous = getattr(_bound, "metrics", None)
+    _bound.metrics = job_metrics
+    try:
+        yield job_metrics
+    finally:
+        _bound.metrics = previous
+
+def timed(stage):
+    """Decorator that records every call of a function as a metrics span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with current_metrics().span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ==========================
+# WORKSPACE
+# ==========================
+class Workspace:
+    """
+    Folder that holds everything one episode writes: prompts, scripts, the
+    job manifest, temporary line audio, segment audio, the full episode, the
+    playlist and metrics. Episodes in different workspaces never touch each
+    other's files, so they can be generated side by side in one process or
+    in several. The TTS and LLM caches are shared by all workspaces.
+    """
+
+    def __init__(self, root="output", job_metrics=None, profile=None):
+        self.root = root
+        self.metrics = job_metrics or Metrics()
+        self.profile = profile or DELIVERY_PROFILE
+
+    @property
+    def audio_extension(self):
+        return DELIVERY_PROFILES[self.profile]["extension"]
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    @property
+    def prompts_dir(self):
+        return self.path("prompts")
+
+    @property
+    def temp_dir(self):
+        return self.path("temp")
+
+    @property
+    def manifest_file(self):
+        return self.path("prompts", "metadata.json")
+
+    @property
+    def full_audio_file(self):
+        return self.path("podcast_full" + self.audio_extension)
+
+    def prompt_file(self, segment_number):
+        return self.path("prompts", f"segment_{segment_number:02d}_prompt.txt")
+
+    def script_file(self, segment_number):
+        return self.path("prompts", f"segment_{segment_number:02d}_script.txt")
+
+    def dialogue_file(self, segment_number):
+        return self.path("prompts", f"segment_{segment_number:02d}_dialogue.json")
+
+    def line_file(self, segment_number, line_number, extension=".mp3", chunk=None):
+        suffix = "" if chunk is None else f"_part_{chunk:02d}"
+        return self.path("temp", f"segment_{segment_number:02d}_line_{line_number:03d}{suffix}{extension}")
 
-genai.configure(api_key=gemini_api_key)
-model = genai.GenerativeModel("gemma-3-1b-it")
+    def segment_audio_file(self, segment_number):
+        return self.path(f"segment_{segment_number:02d}_audio{self.audio_extension}")
 
-# Configure pydub to use custom ffmpeg path if specified
-if PYDUB_AVAILABLE and FFMPEG_PATH:
-    AudioSegment.converter = os.path.join(FFMPEG_PATH, "ffmpeg.exe")
-    AudioSegment.ffmpeg = os.path.join(FFMPEG_PATH, "ffmpeg.exe")
-    AudioSegment.ffprobe = os.path.join(FFMPEG_PATH, "ffprobe.exe")
+    def segment_transcript_file(self, segment_number):
+        return self.path("prompts", f"segment_{segment_number:02d}_transcript.json")
+
+    @property
+    def transcript_file(self):
+        return self.path("transcript.json")
+
+    @property
+    def transcript_vtt_file(self):
+        return self.path("transcript.vtt")
+
+    @property
+    def stream_file(self):
+        return self.path("stream.json")
+
+    @property
+    def playlist_file(self):
+        return self.path("podcast.m3u8")
+
+    def clean_temp(self):
+        """Remove this workspace's temporary line audio (and nothing else)"""
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+
+# Used when no workspace is given: output/ in the working directory
+default_workspace = Workspace("output", metrics)
+
+def with_workspace(func):
+    """
+    Resolve the workspace= argument of an entry point (default_workspace if
+    not given) and record metrics into that workspace while it runs
+    """
+    @functools.wraps(func)
+    def wrapper(*args, workspace=None, **kwargs):
+        workspace = workspace or default_workspace
+        with bind_metrics(workspace.metrics):
+            return func(*args, workspace=workspace, **kwargs)
+    return wrapper
+
+# ==========================
+# HTTP CLIENT
+# ==========================
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """
+    Shared requests.Session for all ElevenLabs calls.
+    Connections are kept alive and pooled, so each request after the first
+    skips the TCP + TLS handshake.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=HTTP_POOL_SIZE
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+    return _http_session
+
+def download_to_file(response, output_file, chunk_size=64 * 1024):
+    """
+    Stream a response body straight to disk instead of buffering it in memory
+    The file only appears under output_file once the download is complete
+    """
+    tmp_file = f"{output_file}.{threading.get_ident()}.part"
+    written = 0
+    try:
+        with open(tmp_file, "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    written += len(chunk)
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return written
 
 # ==========================
 # LLM CALL PLACEHOLDER
 # ==========================
-def call_llm(prompt: str) -> str:
-    response = model.generate_content(prompt)
-    return response.text
+def llm_supports_system_instruction() -> bool:
+    if LLM_SYSTEM_INSTRUCTION is not None:
+        return LLM_SYSTEM_INSTRUCTION
+    return not get_config().llm_model_name.startswith("gemma")
+
+def get_model(system_instruction=None):
+    """The LLM client, created on first use (once per distinct system instruction)"""
+    with _models_lock:
+        if system_instruction not in _models:
+            config = get_config()
+            _models[system_instruction] = config.model_factory(
+                config.llm_model_name, config.llm_generation_config, system_instruction
+            )
+        return _models[system_instruction]
+
+def llm_cache_key(prompt: str, system_instruction=None) -> str:
+    config = get_config()
+    parts = [config.llm_model_name, prompt, config.llm_generation_config]
+    if system_instruction:
+        parts.append(system_instruction)
+    return DiskCache.make_key(*parts)
+
+def call_llm(prompt: str, use_cache: bool = None, system_instruction=None) -> str:
+    """Ask the model for a complete response; use_cache defaults to LLM_CACHE_ENABLED"""
+    if use_cache is None:
+        use_cache = LLM_CACHE_ENABLED
+    if use_cache:
+        cached = llm_cache.read_text(llm_cache_key(prompt, system_instruction))
+        if cached is not None:
+            current_metrics().incr("llm_cache_hits")
+            return cached
+
+    current_metrics().incr("llm_requests")
+    current_metrics().incr("llm_prompt_characters", len(prompt) + len(system_instruction or ""))
+    with current_metrics().span("llm_request"):
+        response = get_model(system_instruction).generate_content(prompt)
+        text = response.text
+    current_metrics().incr("llm_response_characters", len(text))
+
+    if use_cache:
+        llm_cache.write_text(llm_cache_key(prompt, system_instruction), text)
+    return text
+
+def call_llm_stream(prompt: str, use_cache: bool = None, system_instruction=None):
+    """Yield the response text in chunks as the model writes it; use_cache defaults to LLM_CACHE_ENABLED"""
+    if use_cache is None:
+        use_cache = LLM_CACHE_ENABLED
+    if use_cache:
+        cached = llm_cache.read_text(llm_cache_key(prompt, system_instruction))
+        if cached is not None:
+            current_metrics().incr("llm_cache_hits")
+            yield cached
+            return
+
+    current_metrics().incr("llm_requests")
+    current_metrics().incr("llm_prompt_characters", len(prompt) + len(system_instruction or ""))
+    start = time.perf_counter()
+    pieces = []
+    for chunk in get_model(system_instruction).generate_content(prompt, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. only safety ratings)
+            continue
+        if text:
+            if not pieces:
+                current_metrics().observe("llm_first_chunk", time.perf_counter() - start)
+            pieces.append(text)
+            yield text
+    # Includes time the consumer spent between chunks
+    current_metrics().observe("llm_request", time.perf_counter() - start)
+    current_metrics().incr("llm_response_characters", sum(len(piece) for piece in pieces))
+
+    # Only complete responses are cached
+    if use_cache:
+        llm_cache.write_text(llm_cache_key(prompt, system_instruction), "".join(pieces))
 
 # ==========================
 # STEP 1 — CREATE OUTLINE
 # ==========================
-def generate_outline(topic: str, total_minutes: int):
-    num_segments = math.ceil(total_minutes / SEGMENT_MINUTES)
+def count_segments(total_minutes, words_per_minute=None):
+    """
+    Number of segments for an episode of total_minutes at the voices' measured pace
+    No segment asks for more than SEGMENT_MINUTES of words at WORDS_PER_MINUTE
+    """
+    words_per_minute = words_per_minute or pace_model.words_per_minute()
+    total_words = total_minutes * words_per_minute
+    return max(1, math.ceil(total_words / (WORDS_PER_MINUTE * SEGMENT_MINUTES)))
+
+@timed("outline")
+def generate_outline(topic: str, total_minutes: int, use_cache: bool = None,
+                     num_segments: int = None):
+    num_segments = num_segments or count_segments(total_minutes)
 
     prompt = f"""
 Use simple language: Write plainly with short sentences.
@@ -141,43 +787,98 @@ JSON format:
 
 """
 
-    outline_text = call_llm(prompt)
+    outline_text = call_llm(prompt, use_cache=use_cache)
     
     # Debug: Print raw response
     print("Raw LLM Response:")
     print(outline_text)
     print("-" * 50)
     
-    # Extract JSON from markdown code blocks if present
-    if "```json" in outline_text:
-        # Extract content between ```json and ```
-        start = outline_text.find("```json") + 7
-        end = outline_text.find("```", start)
-        outline_text = outline_text[start:end].strip()
-    elif "```" in outline_text:
-        # Extract content between ``` and ```
-        start = outline_text.find("```") + 3
-        end = outline_text.find("```", start)
-        outline_text = outline_text[start:end].strip()
-    
-    # Clean up any leading/trailing whitespace
-    outline_text = outline_text.strip()
-    
-    try:
-        return json.loads(outline_text)
-    except json.JSONDecodeError as e:
+    # Shared tolerant parser also handles code fences and trailing commas
+    outline = parse_json_array(outline_text)
+
+    if not outline:
         print(f"ERROR: Failed to parse JSON")
-        print(f"Error details: {e}")
         print(f"Attempted to parse: {outline_text[:200]}...")
-        raise
+        raise ValueError("LLM did not return a JSON outline")
+
+    return outline
+
+# ==========================
+# STEP 2 — SEGMENT WRITING GUIDELINES
+# ==========================
+# Identical for every segment: sent once as the system instruction where the model
+# supports one, otherwise placed at the start of each segment prompt
+SEGMENT_WRITING_GUIDELINES = """==============================================
+WRITING GUIDELINES:
+==============================================
+
+You write podcast dialogue, one segment at a time.
+
+CONVERSATION STYLE:
+- Two speakers: HOST (curious, non-expert) and EXPERT (knowledgeable)
+- The EXPERT should speak significantly more than the HOST (EXPERT: ~90% of words, HOST: ~10%)
+- The EXPERT can speak for multiple sentences at a time, giving in-depth explanations, examples, or analogies
+- The HOST speaks briefly and occasionally: asks questions, seeks clarification, or reacts naturally
+
+LANGUAGE & TONE:
+- Use simple, spoken language with short sentences when needed
+- Be direct, conversational, and natural
+- Avoid AI clichés like "dive into," "game-changing," "unleash"
+- Write as people actually speak; starting sentences with "and" or "but" is fine
+- Avoid hype, marketing language, or unnecessary adjectives
+- Keep it honest, real, and engaging
+- Do NOT include stage directions or descriptions
+
+OUTPUT FORMAT:
+Return ONLY valid JSON with the dialogue. No markdown, no explanations.
+JSON format:
+[
+  {
+    "speaker": "HOST",
+    "text": "actual words spoken by the host"
+  },
+  {
+    "speaker": "EXPERT",
+    "text": "actual words spoken by the expert"
+  }
+]
+
+IMPORTANT: Return ONLY the JSON array. No additional text or formatting.
+
+"""
+
+def rolling_summary(covered, recent=PROMPT_RECENT_SEGMENTS, max_chars=PROMPT_EARLIER_MAX_CHARS):
+    """
+    Context about earlier segments for the next segment prompt
+    covered is a list of (title, learning_goal), oldest first. The last `recent`
+    segments are listed with their learning goal; older ones by title only,
+    keeping the most recent titles within max_chars.
+    """
+    lines = []
+    split = max(0, len(covered) - recent)
+    older, latest = covered[:split], covered[split:]
+    if older:
+        titles = "; ".join(title for title, _ in older)
+        if len(titles) > max_chars:
+            titles = "…" + titles[-max_chars:].split("; ", 1)[-1]
+        lines.append(f"- Segments 1-{len(older)}: {titles}")
+    start = len(older) + 1
+    for j, (_, goal) in enumerate(latest, start):
+        lines.append(f"- Segment {j}: {goal}")
+    return "\n".join(lines)
 
 # ==========================
 # STEP 2A — CREATE FIRST SEGMENT PROMPT TEMPLATE
 # ==========================
-def create_first_segment_prompt(topic, segment, target_words):
-    """Creates a prompt template for the first segment (with welcome)"""
+def create_first_segment_prompt(topic, segment, target_words, include_guidelines=True):
+    """
+    Creates a prompt template for the first segment (with welcome)
+    Pass include_guidelines=False when SEGMENT_WRITING_GUIDELINES is sent as the system instruction
+    """
+    guidelines = SEGMENT_WRITING_GUIDELINES if include_guidelines else ""
     
-    template = f"""==============================================
+    template = f"""{guidelines}==============================================
 SEGMENT 1 - OPENING SEGMENT (WITH WELCOME)
 ==============================================
 
@@ -203,45 +904,10 @@ ADDITIONAL NOTES / FUN FACTS TO DISCUSS:
 - The EXPERT begins exploring the first concept in depth
 - Set the tone for the entire conversation
 
-==============================================
-WRITING GUIDELINES:
-==============================================
-
-CONVERSATION STYLE:
-- Two speakers: HOST (curious, non-expert) and EXPERT (knowledgeable)
-- The EXPERT should speak significantly more than the HOST (EXPERT: ~90% of words, HOST: ~10%)
-- The EXPERT can speak for multiple sentences at a time, giving in-depth explanations, examples, or analogies
-- The HOST speaks briefly and occasionally: asks questions, seeks clarification, or reacts naturally
-
-LANGUAGE & TONE:
-- Use simple, spoken language with short sentences when needed
-- Be direct, conversational, and natural
-- Avoid AI clichés like "dive into," "game-changing," "unleash"
-- Write as people actually speak; starting sentences with "and" or "but" is fine
-- Avoid hype, marketing language, or unnecessary adjectives
-- Keep it honest, real, and engaging
-
 TARGET:
 - Approximately {target_words} words for this segment
-- Do NOT include stage directions or descriptions
 - Do NOT end with a conclusion; the podcast continues
 
-OUTPUT FORMAT:
-Return ONLY valid JSON with the dialogue. No markdown, no explanations.
-JSON format:
-[
-  {{
-    "speaker": "HOST",
-    "text": "actual words spoken by the host"
-  }},
-  {{
-    "speaker": "EXPERT",
-    "text": "actual words spoken by the expert"
-  }}
-]
-
-IMPORTANT: Return ONLY the JSON array. No additional text or formatting.
-
 ==============================================
 """
     
@@ -251,10 +917,15 @@ IMPORTANT: Return ONLY the JSON array. No additional text or formatting.
 # ==========================
 # STEP 2B — CREATE CONTINUING SEGMENT PROMPT TEMPLATE
 # ==========================
-def create_continuing_segment_prompt(topic, segment, previous_summary, target_words, segment_number):
-    """Creates a prompt template for continuing segments"""
+def create_continuing_segment_prompt(topic, segment, previous_summary, target_words, segment_number,
+                                     include_guidelines=True):
+    """
+    Creates a prompt template for continuing segments
+    Pass include_guidelines=False when SEGMENT_WRITING_GUIDELINES is sent as the system instruction
+    """
+    guidelines = SEGMENT_WRITING_GUIDELINES if include_guidelines else ""
     
-    template = f"""==============================================
+    template = f"""{guidelines}==============================================
 SEGMENT {segment_number} - CONTINUATION
 ==============================================
 
@@ -279,24 +950,6 @@ ADDITIONAL NOTES / FUN FACTS TO DISCUSS:
 - Provide in-depth explanations, examples, stories, or analogies
 - Keep the conversation flowing seamlessly
 
-==============================================
-WRITING GUIDELINES:
-==============================================
-
-CONVERSATION STYLE:
-- Two speakers: HOST (curious, non-expert) and EXPERT (knowledgeable)
-- The EXPERT should speak significantly more than the HOST (EXPERT: ~90% of words, HOST: ~10%)
-- The EXPERT can speak for multiple sentences at a time, giving in-depth explanations, examples, or analogies
-- The HOST speaks briefly and occasionally: asks questions, seeks clarification, or reacts naturally
-
-LANGUAGE & TONE:
-- Use simple, spoken language with short sentences when needed
-- Be direct, conversational, and natural
-- Avoid AI clichés like "dive into," "game-changing," "unleash"
-- Write as people actually speak; starting sentences with "and" or "but" is fine
-- Avoid hype, marketing language, or unnecessary adjectives
-- Keep it honest, real, and engaging
-
 CRITICAL RULES FOR CONTINUATION:
 - Do NOT greet or welcome anyone (the podcast already started)
 - Do NOT reintroduce the topic
@@ -308,40 +961,78 @@ CRITICAL RULES FOR CONTINUATION:
 
 TARGET:
 - Approximately {target_words} words for this segment
-- Do NOT include stage directions or descriptions
 - Do NOT end with a conclusion unless this is the final segment
 
-OUTPUT FORMAT:
-Return ONLY valid JSON with the dialogue. No markdown, no explanations.
-JSON format:
-[
-  {{
-    "speaker": "HOST",
-    "text": "actual words spoken by the host"
-  }},
-  {{
-    "speaker": "EXPERT",
-    "text": "actual words spoken by the expert"
-  }}
-]
-
-IMPORTANT: Return ONLY the JSON array. No additional text or formatting.
-
 ==============================================
 """
     
     return template
 
 
+_TARGET_WORDS = re.compile(r"Approximately \d+ words")
+
+def fit_final_segment(seg, podcast_prompts, words_written):
+    """
+    Re-target the last segment when the earlier scripts came out longer or shorter
+    than planned, so the episode still lands on its length.
+    Returns seg unchanged while the difference is within DURATION_TOLERANCE.
+    """
+    planned = [prompt.get("target_words") for prompt in podcast_prompts]
+    if None in planned:
+        return seg
+    total = sum(planned)
+    target = total - words_written
+    if abs(target - planned[-1]) <= DURATION_TOLERANCE * total:
+        return seg
+    # A much shorter or longer segment than the others would sound rushed or padded
+    target = int(min(max(target, planned[-1] * 0.5), planned[-1] * 1.5))
+    print(f"  📏 Earlier segments came out {words_written - sum(planned[:-1]):+d} words off plan; "
+          f"final segment targets ~{target} words")
+    return dict(seg, target_words=target,
+                prompt_template=_TARGET_WORDS.sub(f"Approximately {target} words",
+                                                  seg["prompt_template"], count=1))
+
+
 # ==========================
 # STEP 3 — BUILD PODCAST PROMPT TEMPLATES
 # ==========================
-def build_podcast(topic, total_minutes):
-    outline = generate_outline(topic, total_minutes)
-    words_per_segment = WORDS_PER_MINUTE * SEGMENT_MINUTES
+@with_workspace
+def build_podcast(topic, total_minutes, resume=True, fresh=False, workspace=None):
+    """
+    Plan the episode and build one prompt template per segment
+    With resume=True a saved outline for the same topic and duration is reused
+    With fresh=True the outline is always newly written (no resume, no LLM cache)
+    Segment count and length follow the voices' measured pace (pace_model)
+    Catalog topics start from the pre-generated entry in CATALOG_DIR, if there is one
+    Starts a new metrics job; the report is written by generate_segments_and_combine
+    """
+    current_metrics().reset()
+    os.makedirs(workspace.prompts_dir, exist_ok=True)
+    words_per_minute = pace_model.words_per_minute()
+    manifest = JobManifest.load(workspace.manifest_file)
+    if resume and not fresh and manifest.matches(topic, total_minutes) and manifest.data.get("outline"):
+        print("♻️  Resuming: reusing saved outline")
+        outline = manifest.data["outline"]
+    elif CATALOG_ENABLED and not fresh and seed_from_catalog(topic, total_minutes, workspace):
+        print("📚 Catalog topic: starting from the pre-generated episode")
+        current_metrics().incr("catalog_hits")
+        outline = JobManifest.load(workspace.manifest_file).data["outline"]
+    else:
+        outline = generate_outline(topic, total_minutes, use_cache=LLM_CACHE_ENABLED and not fresh,
+                                   num_segments=count_segments(total_minutes, words_per_minute))
+        manifest.reset(topic, total_minutes, outline)
+        manifest.save()
+
+    # Split the episode's words evenly; a saved outline may have a different segment count
+    words_per_segment = round(total_minutes * words_per_minute / len(outline))
+    print(f"📏 {words_per_minute:.0f} words/min: {len(outline)} segments of ~{words_per_segment} words")
+
+    # Guidelines go out once as the system instruction when the model takes one
+    system_instruction = SEGMENT_WRITING_GUIDELINES if llm_supports_system_instruction() else None
+    include_guidelines = system_instruction is None
 
     podcast_prompts = []
-    previous_summaries = []
+    covered = []
 
     for i, segment in enumerate(outline, start=1):
         # Use different template for first segment vs continuing segments
@@ -351,72 +1042,246 @@ def build_podcast(topic, total_minutes):
             prompt_template = create_first_segment_prompt(
                 topic,
                 segment,
-                words_per_segment
+                words_per_segment,
+                include_guidelines
             )
         else:
             # Continuing segments: seamless continuation
             print(f"\n📝 Creating prompt template for segment {i}...")
             
-            # Build summary of what was covered previously
-            previous_summary = "\n".join([
-                f"- Segment {j}: {previous_summaries[j-1]}"
-                for j in range(1, i)
-            ])
+            # Bounded summary of what was covered previously
+            previous_summary = rolling_summary(covered)
             
             prompt_template = create_continuing_segment_prompt(
                 topic,
                 segment,
                 previous_summary,
                 words_per_segment,
-                i
+                i,
+                include_guidelines
             )
 
         podcast_prompts.append({
             "segment": i,
             "title": segment["title"],
-            "prompt_template": prompt_template
+            "prompt_template": prompt_template,
+            "system_instruction": system_instruction,
+            "target_words": words_per_segment
         })
 
-        # Store the learning goal for building future summaries
-        previous_summaries.append(segment["learning_goal"])
+        # Store the title and learning goal for building future summaries
+        covered.append((segment["title"], segment["learning_goal"]))
 
     return podcast_prompts
 
 # ==========================
 # STEP 4 — SAVE PROMPT TEMPLATES
 # ==========================
-def save_podcast(topic, podcast_prompts):
-    """Save individual prompt template files for each segment"""
-    os.makedirs("output/prompts", exist_ok=True)
-
-    # Save metadata JSON
-    with open("output/prompts/metadata.json", "w", encoding="utf-8") as f:
-        json.dump({
-            "topic": topic,
-            "total_segments": len(podcast_prompts),
-            "segments": [
-                {
+class JobManifest:
+    """
+    Source of truth for what has been generated for the current episode.
+    Stored as prompts/metadata.json in the workspace and updated after every completed
+    unit (outline, segment script, parsed dialogue, line audio, segment audio)
+    so a failed run can be resumed instead of starting over.
+    """
+
+    def __init__(self, path="output/prompts/metadata.json", data=None):
+        self.path = path
+        self.data = data or {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path="output/prompts/metadata.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError):
+            return cls(path)
+
+    def save(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def matches(self, topic, total_minutes=None):
+        if self.data.get("topic") != topic:
+            return False
+        return total_minutes is None or self.data.get("total_minutes") == total_minutes
+
+    def matches_segments(self, topic, podcast_prompts):
+        """True if this manifest describes the same episode as podcast_prompts"""
+        titles = [seg.get("title") for seg in self.data.get("segments", [])]
+        return self.matches(topic) and titles == [seg["title"] for seg in podcast_prompts]
+
+    def reset(self, topic, total_minutes, outline):
+        with self.lock:
+            self.data = {
+                "topic": topic,
+                "total_minutes": total_minutes,
+                "outline": outline,
+                "status": "outline",
+                "total_segments": len(outline),
+                "segments": []
+            }
+
+    def set_segments(self, podcast_prompts):
+        """Record the segment list, keeping progress of segments that are unchanged"""
+        with self.lock:
+            previous = {
+                (seg.get("segment"), seg.get("title")): seg
+                for seg in self.data.get("segments", [])
+            }
+            self.data["total_segments"] = len(podcast_prompts)
+            self.data["segments"] = [
+                previous.get((seg["segment"], seg["title"]), {
                     "segment": seg["segment"],
                     "title": seg["title"]
-                }
+                })
                 for seg in podcast_prompts
             ]
-        }, f, indent=2)
+
+    def segment(self, segment_number):
+        for seg in self.data.get("segments", []):
+            if seg.get("segment") == segment_number:
+                return seg
+        seg = {"segment": segment_number}
+        self.data.setdefault("segments", []).append(seg)
+        return seg
+
+    def completed_file(self, segment_number, key):
+        """Return the recorded file for a unit if it still exists on disk"""
+        with self.lock:
+            path = self.segment(segment_number).get(key)
+        return path if path and os.path.exists(path) else None
+
+    def completed_line(self, segment_number, line_index, digest=None):
+        """Return the recorded audio file for a line if it still exists and was made from digest"""
+        with self.lock:
+            entry = self.segment(segment_number).get("lines", {}).get(str(line_index))
+        if not isinstance(entry, dict) or entry.get("digest") != digest:
+            return None
+        path = entry.get("file")
+        return path if path and os.path.exists(path) else None
+
+    def value(self, segment_number, key, default=None):
+        with self.lock:
+            return self.segment(segment_number).get(key, default)
+
+    def record(self, segment_number, key, value):
+        with self.lock:
+            self.segment(segment_number)[key] = value
+        self.save()
+
+    def record_line(self, segment_number, line_index, path, digest=None):
+        with self.lock:
+            self.segment(segment_number).setdefault("lines", {})[str(line_index)] = {
+                "file": path, "digest": digest
+            }
+        self.save()
+
+    def set_status(self, status):
+        with self.lock:
+            self.data["status"] = status
+        self.save()
+
+
+@with_workspace
+def save_podcast(topic, podcast_prompts, workspace=None):
+    """Save individual prompt template files for each segment"""
+    os.makedirs(workspace.prompts_dir, exist_ok=True)
+
+    # Save metadata JSON (also the job manifest used to resume generation)
+    manifest = JobManifest.load(workspace.manifest_file)
+    if not manifest.matches(topic):
+        manifest = JobManifest(workspace.manifest_file, data={"topic": topic})
+    manifest.set_segments(podcast_prompts)
+    manifest.save()
 
     # Save individual prompt template files
+    system_instruction = podcast_prompts[0].get("system_instruction") if podcast_prompts else None
+    if system_instruction:
+        with open(workspace.path("prompts", "system_instruction.txt"), "w", encoding="utf-8") as f:
+            f.write(system_instruction)
     for seg in podcast_prompts:
-        filename = f"output/prompts/segment_{seg['segment']:02d}_prompt.txt"
+        filename = workspace.prompt_file(seg['segment'])
         with open(filename, "w", encoding="utf-8") as f:
             f.write(seg["prompt_template"])
         print(f"✅ Saved: {filename}")
 
+# ==========================
+# TOPIC CATALOG
+# ==========================
+def catalog_key(topic, total_minutes):
+    """Folder name of a catalog entry, e.g. space-exploration-30m"""
+    slug = re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-")
+    return f"{slug or 'topic'}-{total_minutes}m"
+
+def catalog_workspace(topic, total_minutes, profile=None, root=CATALOG_DIR):
+    """Workspace of the catalog entry for a topic and duration"""
+    return Workspace(os.path.join(root, catalog_key(topic, total_minutes)), profile=profile)
+
+def seed_from_catalog(topic, total_minutes, workspace, root=CATALOG_DIR):
+    """
+    Copy the catalog entry for topic/total_minutes into workspace and write a
+    job manifest that points at the copies, so the normal resume path picks up
+    the outline, scripts, dialogue and segment audio.
+    Segment audio is only taken if it was encoded with the workspace's profile.
+    Returns False if there is no usable entry.
+    """
+    entry = catalog_workspace(topic, total_minutes, root=root)
+    if os.path.abspath(entry.root) == os.path.abspath(workspace.root):
+        return False
+    stored = JobManifest.load(entry.manifest_file)
+    if not stored.matches(topic, total_minutes) or not stored.data.get("outline"):
+        return False
+
+    def relocate(path):
+        """Path of a stored file inside workspace, copying it there; None if it is gone"""
+        if not path or not os.path.exists(path):
+            return None
+        # Copied rather than linked: files are rewritten in place when a segment is redone
+        target = workspace.path(os.path.relpath(path, entry.root))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(path, target)
+        return target
+
+    segments = []
+    for seg in stored.data.get("segments", []):
+        copied = {"segment": seg.get("segment"), "title": seg.get("title")}
+        for key in ("script_file", "dialogue_file"):
+            path = relocate(seg.get(key))
+            if path:
+                copied[key] = path
+        audio_file = seg.get("audio_file")
+        if audio_file and os.path.splitext(audio_file)[1] == workspace.audio_extension:
+            path = relocate(audio_file)
+            if path:
+                copied["audio_file"] = path
+                copied["duration_ms"] = seg.get("duration_ms", 0)
+                # Timings belong to this audio
+                transcript_file = relocate(seg.get("transcript_file"))
+                if transcript_file:
+                    copied["transcript_file"] = transcript_file
+        segments.append(copied)
+
+    manifest = JobManifest(workspace.manifest_file)
+    manifest.reset(topic, total_minutes, stored.data["outline"])
+    manifest.data["segments"] = segments
+    manifest.data["catalog_entry"] = entry.root
+    manifest.save()
+    return True
+
 # ==========================
 # STEP 5 — ELEVENLABS PODCAST GENERATION
 # ==========================
-def generate_podcast_with_elevenlabs(topic, podcast_prompts):
+@with_workspace
+def generate_podcast_with_elevenlabs(topic, podcast_prompts, workspace=None):
     """Generate a full podcast audio using ElevenLabs API"""
     
-    if not elevenlabs_api_key:
+    if not get_config().elevenlabs_api_key:
         print("❌ ElevenLabs API key not configured!")
         return None
     
@@ -430,10 +1295,10 @@ def generate_podcast_with_elevenlabs(topic, podcast_prompts):
     combined_prompt = "\n\n" + "="*60 + "\n\n".join(full_script_sections)
     
     # Prepare the API request
-    url = "https://api.elevenlabs.io/v1/text-to-speech/podcast"
+    url = f"{get_config().elevenlabs_api_url}/text-to-speech/podcast"
     
     headers = {
-        "xi-api-key": elevenlabs_api_key,
+        "xi-api-key": get_config().elevenlabs_api_key,
         "Content-Type": "application/json"
     }
     
@@ -450,31 +1315,32 @@ def generate_podcast_with_elevenlabs(topic, podcast_prompts):
     try:
         # Create the podcast
         print("📤 Sending request to ElevenLabs...")
-        response = requests.post(url, json=payload, headers=headers)
-        
-        if response.status_code == 200:
-            # Save the audio file
-            audio_filename = "output/podcast_audio.mp3"
-            with open(audio_filename, "wb") as f:
-                f.write(response.content)
-            print(f"✅ Podcast audio saved: {audio_filename}")
-            return audio_filename
-        else:
-            print(f"❌ ElevenLabs API error: {response.status_code}")
-            print(f"Response: {response.text}")
-            return None
+        # Whole-episode generation can take minutes, so only bound the connect phase
+        with get_http_session().post(url, json=payload, headers=headers,
+                                     timeout=(HTTP_CONNECT_TIMEOUT, None), stream=True) as response:
+            if response.status_code == 200:
+                # Save the audio file
+                audio_filename = workspace.path("podcast_audio.mp3")
+                download_to_file(response, audio_filename)
+                print(f"✅ Podcast audio saved: {audio_filename}")
+                return audio_filename
+            else:
+                print(f"❌ ElevenLabs API error: {response.status_code}")
+                print(f"Response: {response.text}")
+                return None
             
     except Exception as e:
         print(f"❌ Error generating podcast: {str(e)}")
         return None
 
-def generate_podcast_with_conversation_mode(topic, podcast_prompts):
+@with_workspace
+def generate_podcast_with_conversation_mode(topic, podcast_prompts, workspace=None):
     """
     Alternative: Generate podcast using ElevenLabs conversational AI
     This creates a more natural dialogue between HOST and EXPERT
     """
     
-    if not elevenlabs_api_key:
+    if not get_config().elevenlabs_api_key:
         print("❌ ElevenLabs API key not configured!")
         return None
     
@@ -487,246 +1353,1796 @@ def generate_podcast_with_conversation_mode(topic, podcast_prompts):
     
     full_prompt = "\n\n".join(segments_text)
     
-    url = "https://api.elevenlabs.io/v1/convai/conversation"
+    url = f"{get_config().elevenlabs_api_url}/convai/conversation"
     
     headers = {
-        "xi-api-key": elevenlabs_api_key,
+        "xi-api-key": get_config().elevenlabs_api_key,
         "Content-Type": "application/json"
     }
     
     payload = {
         "text": full_prompt,
-        "model_id": "eleven_multilingual_v2"
+        "model_id": get_config().tts_model_id
     }
     
     try:
         print("📤 Sending request to ElevenLabs Conversational AI...")
-        response = requests.post(url, json=payload, headers=headers)
-        
-        if response.status_code == 200 or response.status_code == 201:
-            # Check if we got audio directly or need to poll
-            if response.headers.get('content-type', '').startswith('audio'):
-                audio_filename = "output/podcast_audio.mp3"
-                with open(audio_filename, "wb") as f:
-                    f.write(response.content)
-                print(f"✅ Podcast audio saved: {audio_filename}")
-                return audio_filename
-            else:
-                # Handle job-based response
-                result = response.json()
-                if 'audio_url' in result:
-                    print("📥 Downloading audio from URL...")
-                    audio_response = requests.get(result['audio_url'])
-                    audio_filename = "output/podcast_audio.mp3"
-                    with open(audio_filename, "wb") as f:
-                        f.write(audio_response.content)
+        session = get_http_session()
+        with session.post(url, json=payload, headers=headers,
+                          timeout=(HTTP_CONNECT_TIMEOUT, None), stream=True) as response:
+            if response.status_code == 200 or response.status_code == 201:
+                # Check if we got audio directly or need to poll
+                if response.headers.get('content-type', '').startswith('audio'):
+                    audio_filename = workspace.path("podcast_audio.mp3")
+                    download_to_file(response, audio_filename)
                     print(f"✅ Podcast audio saved: {audio_filename}")
                     return audio_filename
-        else:
-            print(f"❌ ElevenLabs API error: {response.status_code}")
-            print(f"Response: {response.text}")
-            return None
+                else:
+                    # Handle job-based response
+                    result = response.json()
+            else:
+                print(f"❌ ElevenLabs API error: {response.status_code}")
+                print(f"Response: {response.text}")
+                return None
+
+        if 'audio_url' in result:
+            print("📥 Downloading audio from URL...")
+            with session.get(result['audio_url'], stream=True,
+                             timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)) as audio_response:
+                audio_filename = workspace.path("podcast_audio.mp3")
+                download_to_file(audio_response, audio_filename)
+            print(f"✅ Podcast audio saved: {audio_filename}")
+            return audio_filename
             
     except Exception as e:
         print(f"❌ Error generating podcast: {str(e)}")
         return None
 
-def combine_audio_segments(segment_files, output_filename="output/podcast_full.mp3"):
-    """Combine multiple audio segment files into one"""
-    
-    if not PYDUB_AVAILABLE:
-        print("⚠️  pydub not installed. Cannot combine segments automatically.")
-        print("   Install with: pip install pydub")
-        print("   Or combine the segments manually using audio editing software.")
+class StreamingAudioWriter:
+    """
+    Encodes audio to a file while it is being appended.
+    Each appended file is decoded on its own and its PCM is piped into a single
+    ffmpeg encoder, so memory stays flat however long the episode gets and
+    nothing is copied on append. Raw .pcm files (16-bit at sample_rate) are
+    piped in without decoding.
+    sample_rate is the rate of the appended samples; the output is encoded
+    with the codec, bitrate and sample rate of the delivery profile.
+    """
+
+    sample_width = 2  # 16-bit PCM
+
+    def __init__(self, output_filename, profile=None, sample_rate=AUDIO_SAMPLE_RATE,
+                 channels=AUDIO_CHANNELS):
+        profile = profile or DELIVERY_PROFILE
+        self.output_filename = output_filename
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames_written = 0
+
+        delivery = DELIVERY_PROFILES[profile]
+        command = [
+            ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+            "-ar", str(delivery["sample_rate"]), "-c:a", delivery["codec"], "-b:a", delivery["bitrate"]
+        ]
+        command += delivery["options"]
+        command += ["-f", delivery["format"], output_filename]
+
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    @property
+    def duration_ms(self):
+        return self.frames_written * 1000 / self.sample_rate
+
+    def _write(self, data):
+        self.process.stdin.write(data)
+        self.frames_written += len(data) // (self.sample_width * self.channels)
+
+    def append_file(self, path):
+        """Decode an audio file and append its samples"""
+        if path.endswith(".pcm"):
+            self.append_pcm_file(path)
+            return
+        with current_metrics().span("decode"):
+            audio = load_pydub().from_file(path)
+            audio = (audio.set_frame_rate(self.sample_rate)
+                          .set_channels(self.channels)
+                          .set_sample_width(self.sample_width))
+        with current_metrics().span("encode"):
+            self._write(audio.raw_data)
+
+    @timed("encode")
+    def append_pcm_file(self, path, chunk_size=64 * 1024):
+        """Append raw samples that are already in the writer's format"""
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                self._write(chunk)
+
+    def append_silence(self, duration_ms):
+        frames = int(self.sample_rate * duration_ms / 1000)
+        self._write(bytes(frames * self.channels * self.sample_width))
+
+    @timed("encode")
+    def close(self):
+        self.process.stdin.close()
+        errors = self.process.stderr.read().decode("utf-8", "replace")
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {self.output_filename}: {errors.strip()}")
+
+    def abort(self):
+        self.process.kill()
+        self.process.wait()
+        if os.path.exists(self.output_filename):
+            os.remove(self.output_filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _id3_size(data):
+    """Length of the ID3v2 tag at the start of data, or 0 if there is none"""
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _syncsafe(n):
+    """ID3v2.4 size: 28 bits spread over four bytes, 7 bits each"""
+    return bytes([(n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F])
+
+
+def hls_timestamp_tag(seconds):
+    """
+    ID3 tag that every HLS packed audio segment starts with (RFC 8216, 3.4):
+    a PRIV frame holding the 33-bit, 90 kHz timestamp of the segment's first sample.
+    """
+    timestamp = round(seconds * 90000) & ((1 << 33) - 1)
+    payload = b"com.apple.streaming.transportStreamTimestamp\x00" + timestamp.to_bytes(8, "big")
+    frame = b"PRIV" + _syncsafe(len(payload)) + b"\x00\x00" + payload
+    return b"ID3\x04\x00\x00" + _syncsafe(len(frame)) + frame
+
+
+def write_hls_timestamp(path, seconds):
+    """Start a segment file with its HLS timestamp tag, replacing any ID3 tag it already has"""
+    with open(path, "rb") as f:
+        data = f.read()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(hls_timestamp_tag(seconds))
+        f.write(memoryview(data)[_id3_size(data):])
+    os.replace(tmp_path, path)
+
+
+def _mp3_audio_range(data):
+    """Return (start, end) of the MPEG frames in an MP3 file, skipping ID3 tags"""
+    start = _id3_size(data)
+    end = len(data)
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return start, end
+
+
+def _mp3_stream_format(data, start):
+    """Return (version, layer, sample rate index, channel mode) of the first frame"""
+    for pos in range(start, min(len(data) - 3, start + 4096)):
+        if data[pos] == 0xFF and (data[pos + 1] & 0xE0) == 0xE0:
+            return ((data[pos + 1] >> 3) & 0x03, (data[pos + 1] >> 1) & 0x03,
+                    (data[pos + 2] >> 2) & 0x03, data[pos + 3] >> 6)
+    return None
+
+
+def concat_mp3_files(input_files, output_filename):
+    """
+    Join MP3 files by copying their frames, with no decode or re-encode.
+    Returns False without writing anything if the files use different formats.
+    """
+    formats = set()
+    for path in input_files:
+        with open(path, "rb") as f:
+            head = f.read(64 * 1024)
+        formats.add(_mp3_stream_format(head, _mp3_audio_range(head)[0]))
+    if len(formats) != 1 or None in formats:
+        return False
+
+    tmp_filename = output_filename + ".tmp"
+    with open(tmp_filename, "wb") as out:
+        for path in input_files:
+            with open(path, "rb") as f:
+                data = f.read()
+            start, end = _mp3_audio_range(data)
+            out.write(memoryview(data)[start:end])
+    os.replace(tmp_filename, output_filename)
+    return True
+
+
+def _adts_stream_format(head):
+    """Return (profile, sample rate index, channels) of an ADTS AAC file's first frame"""
+    if len(head) < 7 or head[0] != 0xFF or (head[1] & 0xF6) != 0xF0:
         return None
-    
+    return head[2] >> 6, (head[2] >> 2) & 0x0F, ((head[2] & 0x01) << 2) | (head[3] >> 6)
+
+
+def concat_adts_files(input_files, output_filename):
+    """
+    Join ADTS AAC files by copying their frames, with no decode or re-encode.
+    Returns False without writing anything if the files use different formats.
+    """
+    formats = set()
+    for path in input_files:
+        with open(path, "rb") as f:
+            head = f.read(1024)
+        start = _id3_size(head)
+        formats.add(_adts_stream_format(head[start:start + 7]))
+    if len(formats) != 1 or None in formats:
+        return False
+
+    tmp_filename = output_filename + ".tmp"
+    with open(tmp_filename, "wb") as out:
+        for path in input_files:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Drop the HLS timestamp tag of published segments
+            out.write(memoryview(data)[_id3_size(data):])
+    os.replace(tmp_filename, output_filename)
+    return True
+
+
+def concat_with_ffmpeg(input_files, output_filename, format):
+    """Join files of one codec with ffmpeg's concat demuxer, copying packets (no re-encode)"""
+    list_filename = output_filename + ".txt"
+    tmp_filename = output_filename + ".tmp"
+    with open(list_filename, "w", encoding="utf-8") as f:
+        for path in input_files:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
     try:
-        print("\n🔗 Combining audio segments...")
-        combined = AudioSegment.empty()
-        
-        for i, segment_file in enumerate(segment_files, 1):
-            print(f"  → Adding segment {i}/{len(segment_files)}...")
-            audio = AudioSegment.from_mp3(segment_file)
-            combined += audio
-        
-        # Export combined audio
-        print(f"  → Exporting combined podcast...")
-        combined.export(output_filename, format="mp3")
-        print(f"✅ Combined podcast saved: {output_filename}")
-        
+        result = subprocess.run([
+            ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_filename,
+            "-c", "copy", "-f", format, tmp_filename
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    finally:
+        os.remove(list_filename)
+    if result.returncode != 0:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        return False
+    os.replace(tmp_filename, output_filename)
+    return True
+
+
+_MP3_BITRATES_KBPS = {
+    # Layer III, by MPEG-1 / MPEG-2 and 2.5
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+_ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050,
+                      16000, 12000, 11025, 8000, 7350]
+
+
+def _mp3_duration(data):
+    """Seconds of audio in the Layer III frames of an MP3 file, counting every frame"""
+    pos, end = _mp3_audio_range(data)
+    samples = 0
+    sample_rate = None
+    while pos + 4 <= end:
+        version = (data[pos + 1] >> 3) & 0x03
+        bitrate_index = data[pos + 2] >> 4
+        rate_index = (data[pos + 2] >> 2) & 0x03
+        if (data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0 or version == 1
+                or (data[pos + 1] >> 1) & 0x03 != 1 or bitrate_index in (0, 15) or rate_index == 3):
+            return None  # Not a plain Layer III stream
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        bitrate = _MP3_BITRATES_KBPS[3 if version == 3 else 2][bitrate_index] * 1000
+        frame_samples = 1152 if version == 3 else 576
+        padding = (data[pos + 2] >> 1) & 0x01
+        pos += frame_samples // 8 * bitrate // sample_rate + padding
+        samples += frame_samples
+    return samples / sample_rate if sample_rate else None
+
+
+def _adts_duration(data):
+    """Seconds of audio in an ADTS AAC file, counting every frame"""
+    pos = _id3_size(data)
+    samples = 0
+    sample_rate = None
+    while pos + 7 <= len(data):
+        header = _adts_stream_format(data[pos:pos + 7])
+        length = ((data[pos + 3] & 0x03) << 11) | (data[pos + 4] << 3) | (data[pos + 5] >> 5)
+        if header is None or header[1] >= len(_ADTS_SAMPLE_RATES) or length < 7:
+            return None
+        sample_rate = _ADTS_SAMPLE_RATES[header[1]]
+        samples += 1024 * ((data[pos + 6] & 0x03) + 1)
+        pos += length
+    return samples / sample_rate if sample_rate else None
+
+
+def encoded_duration(path, profile=None):
+    """
+    Playback length of an MP3 or ADTS segment file in seconds, or None if unknown.
+    This is longer than the PCM that went in: the encoder adds priming samples and
+    pads the last frame, and segments joined frame by frame keep both.
+    Ogg records the padding and players trim it, so there the PCM length is right.
+    """
+    delivery = DELIVERY_PROFILES[profile or DELIVERY_PROFILE]
+    if delivery["format"] not in ("mp3", "adts"):
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return _mp3_duration(data) if delivery["format"] == "mp3" else _adts_duration(data)
+
+
+def delivery_report(audio_file, duration_seconds, profile=None):
+    """Size and effective bitrate of a finished episode file"""
+    profile = profile or DELIVERY_PROFILE
+    size = os.path.getsize(audio_file)
+    delivery = DELIVERY_PROFILES[profile]
+    return {
+        "profile": profile,
+        "file": audio_file,
+        "mime_type": delivery["mime_type"],
+        "bytes": size,
+        "duration_seconds": round(duration_seconds, 3),
+        "bitrate_kbps": round(size * 8 / duration_seconds / 1000, 1) if duration_seconds else None,
+        "target_bitrate": delivery["bitrate"],
+        "sample_rate": delivery["sample_rate"]
+    }
+
+
+@timed("combine")
+def combine_audio_segments(segment_files, output_filename="output/podcast_full.mp3",
+                           profile=None):
+    """Combine multiple audio segment files into one"""
+    profile = profile or DELIVERY_PROFILE
+
+    try:
+        print("\n🔗 Combining audio segments...")
+
+        # Segments we encoded share one format, so they can be joined as-is
+        delivery = DELIVERY_PROFILES[profile]
+        extension = delivery["extension"]
+        if output_filename.endswith(extension) and all(f.endswith(extension) for f in segment_files):
+            if delivery["format"] == "mp3":
+                joined = concat_mp3_files(segment_files, output_filename)
+            elif delivery["format"] == "adts":
+                joined = concat_adts_files(segment_files, output_filename)
+            else:
+                joined = concat_with_ffmpeg(segment_files, output_filename, delivery["format"])
+            if joined:
+                print(f"✅ Combined podcast saved: {output_filename}")
+                return output_filename
+            print("  → Segment formats differ, re-encoding...")
+
+        if not PYDUB_AVAILABLE:
+            print("⚠️  pydub not installed. Cannot combine segments automatically.")
+            print("   Install with: pip install pydub")
+            print("   Or combine the segments manually using audio editing software.")
+            return None
+
+        with StreamingAudioWriter(output_filename, profile) as writer:
+            for i, segment_file in enumerate(segment_files, 1):
+                print(f"  → Adding segment {i}/{len(segment_files)}...")
+                writer.append_file(segment_file)
+        print(f"✅ Combined podcast saved: {output_filename}")
+
         return output_filename
-        
+
     except Exception as e:
         print(f"❌ Error combining segments: {str(e)}")
         return None
 
+class EpisodeStream:
+    """
+    Publishes segments as soon as they are mixed so playback can start before
+    the whole episode is done. Keeps two files up to date in the output folder:
+      - podcast.m3u8: HLS event playlist of the finished segment files
+      - stream.json: the same list plus status, for clients that don't speak HLS
+    The playlist is only written for profiles whose segments are valid HLS media;
+    each published segment then starts with its HLS timestamp tag.
+    """
+
+    def __init__(self, directory="output", playlist_name="podcast.m3u8", profile=None):
+        self.directory = directory
+        self.playlist_path = os.path.join(directory, playlist_name)
+        self.json_path = os.path.join(directory, "stream.json")
+        self.hls = DELIVERY_PROFILES[profile or DELIVERY_PROFILE]["hls"]
+        self.segments = []
+        self.status = "generating"
+        self.full_audio = None
+        # Players expect the target duration to stay put, so start with a generous one;
+        # it only grows if a segment runs longer, since no segment may exceed it
+        self.target_duration = SEGMENT_MINUTES * 60 * 2
+        self._write()
+
+    def add_segment(self, segment_number, path, duration_seconds):
+        if self.hls:
+            write_hls_timestamp(path, sum(seg["duration"] for seg in self.segments))
+        self.segments.append({
+            "segment": segment_number,
+            "file": os.path.relpath(path, self.directory).replace(os.sep, "/"),
+            "duration": round(duration_seconds, 3)
+        })
+        self.target_duration = max(self.target_duration, math.ceil(duration_seconds))
+        self._write()
+        print(f"  📡 Segment {segment_number} is ready to stream")
+
+    def finish(self, status="complete", full_audio=None):
+        self.status = status
+        if full_audio:
+            self.full_audio = os.path.relpath(full_audio, self.directory).replace(os.sep, "/")
+        self._write()
+
+    def _write(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0"
+        ]
+        for seg in self.segments:
+            lines.append(f"#EXTINF:{seg['duration']:.3f},")
+            lines.append(seg["file"])
+        if self.status != "generating":
+            lines.append("#EXT-X-ENDLIST")
+
+        files = [(self.json_path, json.dumps({
+            "status": self.status,
+            "segments": self.segments,
+            "duration": round(sum(seg["duration"] for seg in self.segments), 3),
+            "full_audio": self.full_audio
+        }, indent=2))]
+        if self.hls:
+            files.append((self.playlist_path, "\n".join(lines) + "\n"))
+
+        # Write then rename so a polling player never reads a half-written file
+        for path, content in files:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+
+# Characters that change the parser state; everything else is copied in bulk
+_JSON_SPECIAL = re.compile(r'["\\{}\[\]]')
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]')
+
+def _load_json_object(text):
+    """Parse one JSON object, repairing the mistakes LLMs usually make"""
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+
+    # Trailing commas, smart quotes used as delimiters, stray control characters
+    fixed = _TRAILING_COMMA.sub(r"\1", text)
+    fixed = fixed.replace('\u201C', '"').replace('\u201D', '"')
+    fixed = _CONTROL_CHARS.sub('', fixed)
+    try:
+        return json.loads(fixed, strict=False)
+    except ValueError:
+        return None
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for the JSON array of objects an LLM writes.
+    feed() text as it arrives and get back each object as soon as it closes;
+    close() at the end salvages a final object cut off after its last value.
+    Text around the array (code fences, chatter) is ignored, broken objects are
+    skipped instead of failing the whole array, and no text is scanned twice.
+    Brackets in the chatter before the first object don't open or close the array.
+    """
+
+    def __init__(self):
+        self.objects_read = 0  # Objects closed so far, parsed or not
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escape_pending = False  # Last chunk ended on a backslash inside a string
+        self.current = []  # Pieces of the object being read
+
+    def feed(self, chunk):
+        objects = []
+        if self.finished or not chunk:
+            return objects
+
+        escaped = 0 if self.escape_pending else -1
+        self.escape_pending = False
+        start = 0 if self.depth else None
+
+        for match in _JSON_SPECIAL.finditer(chunk):
+            i = match.start()
+            ch = match.group()
+            if i == escaped:
+                continue
+
+            if self.in_string:
+                if ch == "\\":
+                    escaped = i + 1
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if self.depth == 0:
+                if ch == "{":
+                    self.depth = 1
+                    start = i
+                elif ch == "]" and self.objects_read:
+                    self.finished = True
+                    break
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.objects_read += 1
+                    self.current.append(chunk[start:i + 1])
+                    obj = _load_json_object("".join(self.current))
+                    self.current = []
+                    start = None
+                    if obj is not None:
+                        objects.append(obj)
+
+        if escaped == len(chunk):
+            self.escape_pending = True
+        if self.depth and start is not None:
+            self.current.append(chunk[start:])
+        return objects
+
+    def close(self):
+        """Finish parsing; returns a truncated final object if it can be completed"""
+        objects = []
+        # An object cut off inside a string would be missing words, so drop it
+        if self.depth and not self.in_string:
+            text = "".join(self.current).rstrip().rstrip(",")
+            obj = _load_json_object(text + "}" * self.depth)
+            if obj is not None:
+                objects.append(obj)
+        self.depth = 0
+        self.current = []
+        self.finished = True
+        return objects
+
+
+def parse_json_array(text):
+    """Parse a complete LLM response holding a JSON array of objects"""
+    parser = JsonArrayStreamParser()
+    return parser.feed(text) + parser.close()
+
+def _parse_plain_dialogue(script_text):
+    """Fallback for scripts written as 'HOST: ...' / 'EXPERT: ...' lines"""
+    dialogue = []
+    for line in script_text.split('\n'):
+        line = line.strip()
+        if line.startswith('HOST:'):
+            dialogue.append({"speaker": "HOST", "text": line[5:].strip()})
+        elif line.startswith('EXPERT:'):
+            dialogue.append({"speaker": "EXPERT", "text": line[7:].strip()})
+        elif line and dialogue and not line.startswith(('```', '[', ']', '{', '}')):
+            # Continuation of the previous speaker's turn
+            dialogue[-1]["text"] += " " + line
+    return [turn for turn in dialogue if turn["text"]]
+
+def is_dialogue_line(obj):
+    return isinstance(obj, dict) and isinstance(obj.get("text"), str) and obj["text"].strip() != ""
+
 def parse_dialogue_json(script_text):
     """Parse the LLM-generated script and extract JSON dialogue"""
-    import re
-    
-    # Try to extract JSON from markdown code blocks if present
-    if "```json" in script_text:
-        start = script_text.find("```json") + 7
-        end = script_text.find("```", start)
-        script_text = script_text[start:end].strip()
-    elif "```" in script_text:
-        start = script_text.find("```") + 3
-        end = script_text.find("```", start)
-        script_text = script_text[start:end].strip()
-    
-    # Clean up the text - remove any problematic control characters
-    script_text = script_text.strip()
-    
-    # Remove any control characters except newlines and tabs
-    script_text = re.sub(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]', '', script_text)
-    
-    try:
-        dialogue = json.loads(script_text)
+    dialogue = [obj for obj in parse_json_array(script_text) if is_dialogue_line(obj)]
+    if dialogue:
         return dialogue
-    except json.JSONDecodeError as e:
-        print(f"  ⚠️  Failed to parse JSON: {e}")
-        print(f"  Attempting to fix and retry...")
-        
-        # Try fixing common JSON issues
+
+    print(f"  ⚠️  No JSON dialogue found, trying plain 'HOST:' / 'EXPERT:' lines...")
+    dialogue = _parse_plain_dialogue(script_text)
+
+    if dialogue:
+        print(f"  ✅ Extracted {len(dialogue)} dialogue lines manually")
+        return dialogue
+    else:
+        print(f"  ❌ Could not parse dialogue")
+        return None
+
+class DiskCache:
+    """
+    Content-addressed file cache with size-bounded LRU eviction
+    Entries are named by a SHA-256 of their key; a hit refreshes the file's mtime
+    so eviction removes the least recently used entries first.
+    Text entries can also expire after ttl_seconds, counted from when they were written.
+    """
+
+    def __init__(self, directory, max_bytes, suffix="", ttl_seconds=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.size = None  # Bytes on disk, counted lazily on first store
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        blob = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def path_for(self, key, suffix=None):
+        return os.path.join(self.directory, key[:2], key + (self.suffix if suffix is None else suffix))
+
+    def fetch(self, key, output_file, suffix=None):
+        """Copy a cached entry to output_file. Returns True on a hit"""
+        path = self.path_for(key, suffix)
         try:
-            # Replace smart quotes with regular quotes
-            script_text = script_text.replace('\u2018', "'").replace('\u2019', "'")
-            script_text = script_text.replace('\u201C', '"').replace('\u201D', '"')
-            
-            # Try parsing again
-            dialogue = json.loads(script_text)
-            print(f"  ✅ Successfully parsed after fixing quotes")
-            return dialogue
-        except:
-            pass
-        
-        print(f"  Attempting to extract dialogue manually...")
-        
-        # Fallback: Try to parse line by line if JSON fails
-        lines = script_text.split('\n')
-        dialogue = []
-        current_speaker = None
-        current_text = ""
-        
-        for line in lines:
-            line = line.strip()
-            # Look for speaker patterns
-            if '"speaker"' in line and '"HOST"' in line:
-                if current_speaker and current_text:
-                    dialogue.append({"speaker": current_speaker, "text": current_text.strip()})
-                current_speaker = "HOST"
-                current_text = ""
-            elif '"speaker"' in line and '"EXPERT"' in line:
-                if current_speaker and current_text:
-                    dialogue.append({"speaker": current_speaker, "text": current_text.strip()})
-                current_speaker = "EXPERT"
-                current_text = ""
-            elif '"text"' in line:
-                # Extract text value
-                match = re.search(r'"text"\s*:\s*"(.+)"', line)
-                if match:
-                    current_text = match.group(1)
-            elif line.startswith('HOST:'):
-                if current_speaker and current_text:
-                    dialogue.append({"speaker": current_speaker, "text": current_text.strip()})
-                current_speaker = "HOST"
-                current_text = line[5:].strip()
-            elif line.startswith('EXPERT:'):
-                if current_speaker and current_text:
-                    dialogue.append({"speaker": current_speaker, "text": current_text.strip()})
-                current_speaker = "EXPERT"
-                current_text = line[7:].strip()
-        
-        # Don't forget the last entry
-        if current_speaker and current_text:
-            dialogue.append({"speaker": current_speaker, "text": current_text.strip()})
-        
-        if dialogue:
-            print(f"  ✅ Extracted {len(dialogue)} dialogue lines manually")
-            return dialogue
-        else:
-            print(f"  ❌ Could not parse dialogue")
+            shutil.copyfile(path, output_file)
+            os.utime(path)
+        except OSError:
+            self._count(hit=False)
+            return False
+        self._count(hit=True)
+        return True
+
+    def read_text(self, key):
+        """Return a cached text entry, or None if missing or expired"""
+        path = self.path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if self.ttl_seconds and time.time() - entry["created"] > self.ttl_seconds:
+                os.remove(path)
+                raise OSError("expired")
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self._count(hit=False)
             return None
+        self._count(hit=True)
+        return entry["text"]
 
-def generate_audio_for_line(text, voice_id, output_file, max_retries=3):
-    """Generate audio for a single line of dialogue with retry logic"""
-    
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+    def write_text(self, key, text):
+        """Add a text entry, stamped with its creation time for the TTL"""
+        path = self.path_for(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "text": text}, f)
+            os.replace(tmp_path, path)
+            added = os.path.getsize(path)
+        except OSError as e:
+            print(f"    ⚠️  Could not write cache entry: {e}")
+            return
+        self._track(added)
+
+    def _count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def store(self, key, source_file, suffix=None):
+        """Add a file to the cache, evicting old entries if over the size limit"""
+        path = self.path_for(key, suffix)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write under a unique name first so readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(source_file, tmp_path)
+            os.replace(tmp_path, path)
+            added = os.path.getsize(path)
+        except OSError as e:
+            print(f"    ⚠️  Could not write cache entry: {e}")
+            return
+        self._track(added)
+
+    def _track(self, added):
+        with self.lock:
+            if self.size is None:
+                self.size = self._scan_size()
+            else:
+                self.size += added
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Trim to 90% of the limit so we don't rescan on every store
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.size = total
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Every entry is stored with its own suffix: the line audio's extension or .json for timings
+tts_cache = DiskCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES)
+llm_cache = DiskCache(LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES, suffix=".json",
+                      ttl_seconds=LLM_CACHE_TTL_SECONDS)
+
+
+class PaceModel:
+    """
+    Measured speaking pace, persisted in PACE_FILE and shared by all jobs.
+    voices: words synthesized and seconds of audio they produced, per voice
+    dialogue: lines and words of the written scripts, to account for the pause after each line
+    """
+
+    def __init__(self, path=PACE_FILE):
+        self.path = path
+        self.data = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.data is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                self.data = {}
+            self.data.setdefault("voices", {})
+            self.data.setdefault("dialogue", {"lines": 0, "words": 0})
+        return self.data
+
+    def observe_speech(self, voice_id, words, seconds):
+        if words <= 0 or seconds <= 0:
+            return
+        with self.lock:
+            entry = self._load()["voices"].setdefault(voice_id, {"words": 0, "seconds": 0.0})
+            entry["words"] += words
+            entry["seconds"] += seconds
+            if entry["seconds"] > PACE_HISTORY_SECONDS:
+                # Halve the history so recent audio counts more
+                entry["words"] /= 2
+                entry["seconds"] /= 2
+
+    def observe_dialogue(self, dialogue):
+        words = sum(len(line.get("text", "").split()) for line in dialogue)
+        with self.lock:
+            entry = self._load()["dialogue"]
+            entry["lines"] += len(dialogue)
+            entry["words"] += words
+
+    def words_per_minute(self, voice_ids=None):
+        """
+        Words of script per minute of finished audio for an episode with these voices,
+        pauses between lines included. Falls back to WORDS_PER_MINUTE until enough
+        audio has been measured. Voices are weighted by how many words they speak.
+        """
+        if voice_ids is None:
+            voice_ids = (get_config().host_voice_id, get_config().expert_voice_id)
+        with self.lock:
+            data = self._load()
+            measured = [data["voices"][v] for v in voice_ids
+                        if data["voices"].get(v, {}).get("seconds", 0) >= PACE_MIN_SECONDS]
+            dialogue = dict(data["dialogue"])
+        if not measured:
+            return WORDS_PER_MINUTE
+        words = sum(entry["words"] for entry in measured)
+        seconds_per_word = sum(entry["seconds"] for entry in measured) / words
+        if dialogue["words"]:
+            seconds_per_word += LINE_PAUSE_MS / 1000 * dialogue["lines"] / dialogue["words"]
+        return 60 / seconds_per_word
+
+    def save(self):
+        """Write the measured pace to PACE_FILE; a failed write is logged, never raised"""
+        with self.lock:
+            if self.data is None:
+                return
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                # Only calibration is lost; the episode carries on
+                print(f"  ⚠️  Could not save voice pace to {self.path}: {e}")
+                if os.path.isfile(tmp_path):
+                    os.remove(tmp_path)
+
+
+pace_model = PaceModel()
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by all TTS workers.
+    Halves its rate when the API answers 429 and slowly recovers on success.
+    """
+
+    def __init__(self, rate=TTS_REQUESTS_PER_SECOND, burst=TTS_BURST):
+        self.max_rate = float(rate)
+        self.min_rate = self.max_rate / 8
+        self.rate = self.max_rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            current_metrics().sleep("rate_limit_wait", wait)
+
+    def try_acquire(self):
+        """Take a token only if one is free right now (used for optional extra requests)"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_rate_limited(self, retry_after=None):
+        """Slow down after a 429 and pause every worker for Retry-After seconds"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            pause = retry_after if retry_after else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+        return pause
+
+
+def parse_retry_after(response):
+    """Return the Retry-After header in seconds, or None if missing/invalid"""
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Seconds to wait before retry number attempt + 1: exponential back-off with
+    full jitter, so parallel workers don't retry in lockstep, but never shorter
+    than the server's Retry-After
+    """
+    ceiling = min(TTS_BACKOFF_MAX, TTS_BACKOFF_BASE * 2 ** attempt)
+    return max(retry_after or 0.0, random.uniform(0, ceiling))
+
+
+class LatencyTracker:
+    """Rolling window of recent successful TTS request latencies"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def hedge_delay(self):
+        """Seconds after which a request counts as slow, or None until enough samples are in"""
+        with self.lock:
+            if len(self.samples) < TTS_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return max(TTS_HEDGE_MIN_DELAY, p95)
+
+
+class CircuitBreaker:
+    """
+    Fails TTS calls fast while ElevenLabs is failing instead of letting every
+    line burn through its retries.
+    closed: requests go out; the outcomes of the last `window` are tracked
+    open: the failure rate crossed the threshold; calls are refused for `cooldown` seconds
+    half-open: one trial request is let through; success closes, failure re-opens
+    allow() hands out a ticket that goes back with the outcome to record(), so only the
+    trial can move the breaker out of half-open; requests that were already in flight
+    when it opened are ignored.
+    """
+
+    def __init__(self, window=TTS_BREAKER_WINDOW, failure_rate=TTS_BREAKER_FAILURE_RATE,
+                 cooldown=TTS_BREAKER_COOLDOWN):
+        self.outcomes = deque(maxlen=window)
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.trials = 0  # Ticket of the latest trial; 0 is the ticket of requests sent while closed
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Ticket for a request that may be sent now, or None if it must not be sent"""
+        with self.lock:
+            if self.state == "closed":
+                return 0
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half-open"
+            if self.state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                self.trials += 1
+                return self.trials
+            return None
+
+    def record(self, ticket, ok):
+        """
+        Record the outcome of the request allow() gave ticket to: True, False, or None
+        for one that says nothing about the provider's health (e.g. a 429)
+        """
+        with self.lock:
+            if self.state == "half-open" and ticket == self.trials:
+                self.trial_in_flight = False
+                if ok:
+                    self.state = "closed"
+                    self.outcomes.clear()
+                elif ok is False:
+                    self._open()
+                return
+            if self.state != "closed" or ticket or ok is None:
+                # A late outcome of a request sent before the breaker opened, or an old trial
+                return
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if (len(self.outcomes) == self.outcomes.maxlen
+                    and failures >= self.failure_rate * len(self.outcomes)):
+                self._open()
+
+    def _open(self):
+        if self.state != "open":
+            print(f"    ⛔ ElevenLabs is failing, pausing TTS requests for {self.cooldown}s")
+            current_metrics().incr("tts_breaker_opened")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+
+
+# Shared by every job in the process: they all talk to the same API
+tts_latency = LatencyTracker()
+tts_breaker = CircuitBreaker()
+
+
+def tts_pcm_sample_rate(output_format=TTS_OUTPUT_FORMAT):
+    """Sample rate of a "pcm_<rate>" TTS format, or None for compressed formats"""
+    codec, _, rate = output_format.partition("_")
+    return int(rate) if codec == "pcm" and rate.isdigit() else None
+
+def tts_file_extension(output_format=TTS_OUTPUT_FORMAT):
+    return ".pcm" if tts_pcm_sample_rate(output_format) else "." + output_format.split("_")[0]
+
+def tts_audio_seconds(num_bytes, output_format=TTS_OUTPUT_FORMAT):
+    """Length of TTS audio worked out from its size, or None if the format doesn't tell"""
+    rate = tts_pcm_sample_rate(output_format)
+    if rate:
+        return num_bytes / (2 * rate)
+    codec, _, rest = output_format.partition("_")
+    bitrate = rest.rpartition("_")[2]
+    if codec == "mp3" and bitrate.isdigit():
+        return num_bytes * 8 / (int(bitrate) * 1000)
+    return None
+
+def alignment_file_for(audio_file):
+    """Character timing sidecar written next to a line's audio file"""
+    return os.path.splitext(audio_file)[0] + ".alignment.json"
+
+def _send_tts_request(url, payload, headers, audio_file, with_timestamps):
+    """
+    Send one TTS request and save the audio to audio_file (timings to audio_file + ".json")
+    Returns a dict whose "status" is "ok", "rate_limited" or "error"
+    """
+    import requests
+    request_start = time.perf_counter()
+    try:
+        # Connection is reused from the pool; the body streams straight to disk
+        with get_http_session().post(url, json=payload, headers=headers,
+                                     params={"output_format": TTS_OUTPUT_FORMAT},
+                                     timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                                     stream=True) as response:
+            if response.status_code == 200:
+                if with_timestamps:
+                    # Audio comes back base64-encoded next to the timings
+                    result = response.json()
+                    audio = base64.b64decode(result["audio_base64"])
+                    with open(audio_file, "wb") as f:
+                        f.write(audio)
+                    with open(audio_file + ".json", "w", encoding="utf-8") as f:
+                        json.dump(result.get("alignment") or {}, f)
+                    downloaded = len(audio)
+                else:
+                    downloaded = download_to_file(response, audio_file)
+                return {"status": "ok", "seconds": time.perf_counter() - request_start,
+                        "bytes": downloaded}
+            if response.status_code == 429:
+                return {"status": "rate_limited", "retry_after": parse_retry_after(response)}
+            current_metrics().incr("tts_errors")
+            # Client errors other than 408 won't succeed on a retry
+            retryable = response.status_code >= 500 or response.status_code == 408
+            return {"status": "error", "message": f"{response.status_code} - {response.text}",
+                    "retryable": retryable, "retry_after": parse_retry_after(response)}
+
+    except requests.exceptions.Timeout:
+        current_metrics().incr("tts_timeouts")
+        return {"status": "error", "message": "Request timed out", "retryable": True}
+    except requests.exceptions.ConnectionError as e:
+        current_metrics().incr("tts_connection_errors")
+        return {"status": "error", "message": f"Connection error: {str(e)}", "retryable": True}
+    except Exception as e:
+        current_metrics().incr("tts_errors")
+        return {"status": "error", "message": str(e), "retryable": True}
+
+def _remove_files(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _run_in_thread(fn, *args):
+    """Run fn(*args) on a new thread (bound to the caller's metrics) and return a Future"""
+    future = Future()
+    job_metrics = current_metrics()
+
+    def run():
+        _set_thread_metrics(job_metrics)
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="tts-request", daemon=True).start()
+    return future
+
+def _send_hedged(send, rate_limiter=None):
+    """
+    Call send(n) for request n = 0. If it hasn't answered by the hedge deadline
+    (recent p95 latency), start request 1 as well and use whichever succeeds first.
+    The slower copy finishes in the background and its files are deleted.
+    Returns (n, result) for the request whose result counts.
+    """
+    deadline = tts_latency.hedge_delay() if TTS_HEDGE_ENABLED else None
+    if deadline is None:
+        return 0, send(0)
+
+    futures = {_run_in_thread(send, 0): 0}
+    done, _ = wait(futures, timeout=deadline)
+    # A hedge is an extra request, so it only goes out if the rate limit has room
+    if not done and (rate_limiter is None or rate_limiter.try_acquire()):
+        current_metrics().incr("tts_hedged")
+        futures[_run_in_thread(send, 1)] = 1
+
+    winner = last = None
+    for future in as_completed(futures):
+        last = (futures[future], future.result())
+        if last[1]["status"] == "ok":
+            winner = last
+            break
+    if winner is None:
+        # Every copy failed; report the last failure
+        return last
+    if winner[0]:
+        current_metrics().incr("tts_hedge_wins")
+    for future, n in futures.items():
+        if n != winner[0]:
+            future.add_done_callback(lambda f, n=n: send.discard(n))
+    return winner
+
+def tts_cache_key(text, voice_id, previous_text=None, next_text=None):
+    """TTS cache key of a request; everything that changes the audio is part of it"""
+    key_parts = [text, voice_id, get_config().tts_model_id, TTS_VOICE_SETTINGS, TTS_OUTPUT_FORMAT]
+    if previous_text or next_text:
+        # Context changes the delivery
+        key_parts += [previous_text or "", next_text or ""]
+    return DiskCache.make_key(*key_parts)
+
+@timed("tts_line")
+def generate_audio_for_line(text, voice_id, output_file, max_retries=TTS_MAX_RETRIES,
+                            rate_limiter=None, use_cache=None,
+                            with_timestamps=False, previous_text=None, next_text=None,
+                            retake=False):
+    """
+    Generate audio for a single line of dialogue with retry logic
+    If a rate_limiter is given, it paces requests and handles 429 back-off
+    Identical requests are served from the TTS cache unless use_cache is False
+    (default: TTS_CACHE_ENABLED); retake=True asks for a new take and replaces the cached one
+    With with_timestamps=True, character timings are saved to alignment_file_for(output_file)
+    previous_text/next_text give ElevenLabs the surrounding text when text is part of a longer turn
+    Slow requests are hedged with a duplicate; while tts_breaker is open the call fails immediately
+    """
+    if use_cache is None:
+        use_cache = TTS_CACHE_ENABLED
+
+    url = f"{get_config().elevenlabs_api_url}/text-to-speech/{voice_id}"
+    if with_timestamps:
+        url += "/with-timestamps"
+    alignment_file = alignment_file_for(output_file)
     
     headers = {
-        "xi-api-key": elevenlabs_api_key,
+        "xi-api-key": get_config().elevenlabs_api_key,
         "Content-Type": "application/json"
     }
     
     payload = {
         "text": text,
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.75,
-            "style": 0.0,
-            "use_speaker_boost": True
-        }
+        "model_id": get_config().tts_model_id,
+        "voice_settings": TTS_VOICE_SETTINGS
     }
-    
-    for attempt in range(max_retries):
-        try:
-            # Longer timeout for better reliability
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                with open(output_file, "wb") as f:
-                    f.write(response.content)
-                return True
-            elif response.status_code == 429:
-                # Rate limit hit - wait longer
-                wait_time = (attempt + 1) * 5
-                print(f"    ⚠️  Rate limit hit. Waiting {wait_time} seconds...")
-                time.sleep(wait_time)
-                continue
-            else:
-                print(f"    ❌ Error: {response.status_code} - {response.text}")
-                if attempt < max_retries - 1:
-                    print(f"    🔄 Retrying... (attempt {attempt + 2}/{max_retries})")
-                    time.sleep(2)
-                    continue
-                return False
-                
-        except requests.exceptions.Timeout:
-            print(f"    ⚠️  Request timed out")
-            if attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 3
-                print(f"    🔄 Retrying in {wait_time} seconds... (attempt {attempt + 2}/{max_retries})")
-                time.sleep(wait_time)
-                continue
+    if previous_text or next_text:
+        payload["previous_text"] = previous_text or ""
+        payload["next_text"] = next_text or ""
+
+    cache_key = tts_cache_key(text, voice_id, previous_text, next_text)
+    audio_suffix = os.path.splitext(output_file)[1]
+    if use_cache and not retake and tts_cache.fetch(cache_key, output_file, suffix=audio_suffix):
+        if not with_timestamps or tts_cache.fetch(cache_key, alignment_file, suffix=".json"):
+            current_metrics().incr("tts_cache_hits")
+            return True
+    if use_cache:
+        current_metrics().incr("tts_cache_misses")
+
+    # Each copy of a hedged request downloads to its own file; the winner is moved into place
+    def attempt_file(n):
+        return f"{output_file}.{n}.try"
+
+    def send(n):
+        return _send_tts_request(url, payload, headers, attempt_file(n), with_timestamps)
+
+    send.discard = lambda n: _remove_files(attempt_file(n), attempt_file(n) + ".json")
+
+    attempt = 0  # Failed attempts; 429s only count when no rate limiter paces the requests
+    rate_limited = 0
+    while attempt < max_retries:
+        ticket = tts_breaker.allow()
+        if ticket is None:
+            current_metrics().incr("tts_breaker_rejected")
+            print(f"    ⛔ Skipping line, ElevenLabs is failing (circuit open)")
             return False
-            
-        except requests.exceptions.ConnectionError as e:
-            print(f"    ⚠️  Connection error: {str(e)}")
-            if attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 5
-                print(f"    🔄 Retrying in {wait_time} seconds... (attempt {attempt + 2}/{max_retries})")
-                time.sleep(wait_time)
-                continue
-            return False
-            
-        except Exception as e:
-            print(f"    ❌ Error: {str(e)}")
-            if attempt < max_retries - 1:
-                print(f"    🔄 Retrying... (attempt {attempt + 2}/{max_retries})")
-                time.sleep(2)
-                continue
+        if rate_limiter:
+            rate_limiter.acquire()
+
+        current_metrics().incr("tts_requests")
+        if attempt or rate_limited:
+            current_metrics().incr("tts_retries")
+
+        n, result = _send_hedged(send, rate_limiter)
+
+        if result["status"] == "ok":
+            tts_breaker.record(ticket, True)
+            os.replace(attempt_file(n), output_file)
+            if with_timestamps:
+                os.replace(attempt_file(n) + ".json", alignment_file)
+            tts_latency.add(result["seconds"])
+            current_metrics().observe("tts_request", result["seconds"])
+            current_metrics().incr("tts_bytes_downloaded", result["bytes"])
+            current_metrics().incr("tts_characters", len(text))
+            seconds = tts_audio_seconds(result["bytes"])
+            if seconds:
+                pace_model.observe_speech(voice_id, len(text.split()), seconds)
+            if rate_limiter:
+                rate_limiter.on_success()
+            if use_cache:
+                tts_cache.store(cache_key, output_file, suffix=audio_suffix)
+                if with_timestamps:
+                    tts_cache.store(cache_key, alignment_file, suffix=".json")
+            return True
+
+        if result["status"] == "rate_limited":
+            # Throttling says nothing about the API's health
+            tts_breaker.record(ticket, None)
+            send.discard(n)
+            current_metrics().incr("tts_rate_limited")
+            if rate_limiter:
+                rate_limited += 1
+                if rate_limited >= TTS_MAX_RATE_LIMITED:
+                    print(f"    ❌ Still rate limited after {rate_limited} tries, giving up on this line")
+                    return False
+                wait_time = rate_limiter.on_rate_limited(result["retry_after"])
+                print(f"    ⚠️  Rate limit hit. Slowing down, pausing {wait_time:.1f} seconds...")
+            else:
+                wait_time = backoff_delay(attempt, result["retry_after"])
+                print(f"    ⚠️  Rate limit hit. Waiting {wait_time:.1f} seconds...")
+                current_metrics().sleep("rate_limit_backoff", wait_time)
+                attempt += 1
+            continue
+
+        tts_breaker.record(ticket, False)
+        send.discard(n)
+        print(f"    ❌ Error: {result['message']}")
+        if not result["retryable"] or attempt == max_retries - 1:
             return False
+        wait_time = backoff_delay(attempt, result.get("retry_after"))
+        print(f"    🔄 Retrying in {wait_time:.1f} seconds... (attempt {attempt + 2}/{max_retries})")
+        current_metrics().sleep("retry_backoff", wait_time)
+        attempt += 1
     
     return False
 
-def generate_segments_and_combine(topic, podcast_prompts):
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?…])\s+')
+_CLAUSE_BREAK = re.compile(r'(?<=[,;:—])\s+')
+
+def split_text_into_chunks(text, max_chars=None):
+    """
+    Split text at sentence boundaries into chunks of at most max_chars
+    (default: TTS_CHUNK_MAX_CHARS; 0 never splits).
+    Sentences that are too long on their own are split at commas and
+    semicolons, then between words.
+    """
+    if max_chars is None:
+        max_chars = TTS_CHUNK_MAX_CHARS
+    if not max_chars or len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    for sentence in _SENTENCE_BREAK.split(text.strip()):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE_BREAK.split(sentence):
+            pieces.extend([clause] if len(clause) <= max_chars else clause.split())
+
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] += " " + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+def batch_dialogue_lines(dialogue, max_chars=None, chunk_max_chars=None):
+    """
+    Group dialogue lines into synthesis units, one TTS request each.
+    Adjacent lines by the same speaker are merged while the combined text stays
+    within max_chars; with max_chars=0 every line is its own unit.
+    Lines longer than chunk_max_chars become several chunk units instead; all
+    but the last have gap_after=False so they are joined without a pause.
+    Units are yielded as soon as they are complete, so dialogue can be a live stream.
+    max_chars and chunk_max_chars default to TTS_BATCH_MAX_CHARS and TTS_CHUNK_MAX_CHARS.
+    """
+    if max_chars is None:
+        max_chars = TTS_BATCH_MAX_CHARS
+    unit = None
+    for j, line in enumerate(dialogue):
+        speaker = line.get("speaker", "EXPERT")
+        text = line.get("text", "")
+
+        if not text:
+            continue
+
+        chunks = split_text_into_chunks(text, chunk_max_chars)
+        if len(chunks) > 1:
+            if unit:
+                yield unit
+                unit = None
+            for c, chunk in enumerate(chunks):
+                yield {
+                    "lines": [j], "key": f"{j}.{c}", "chunk": c, "speaker": speaker,
+                    "text": chunk, "texts": [chunk], "gap_after": c == len(chunks) - 1,
+                    "previous_text": chunks[c - 1] if c else None,
+                    "next_text": chunks[c + 1] if c + 1 < len(chunks) else None
+                }
+            continue
+
+        if (max_chars and unit and unit["speaker"] == speaker
+                and len(unit["text"]) + 1 + len(text) <= max_chars):
+            unit["lines"].append(j)
+            unit["texts"].append(text)
+            unit["text"] += " " + text
+            continue
+
+        if unit:
+            yield unit
+        unit = {"lines": [j], "key": str(j), "speaker": speaker, "text": text, "texts": [text],
+                "gap_after": True}
+
+        if not max_chars:
+            # Nothing can be merged into it, so don't hold it back
+            yield unit
+            unit = None
+
+    if unit:
+        yield unit
+
+def split_alignment(alignment_file, line_indexes, texts):
+    """
+    Add per-line start/end times to a merged request's alignment file.
+    The merged text is the lines joined by single spaces, so each line's span
+    of characters is known and its timing is read off the character timings.
+    """
+    with open(alignment_file, "r", encoding="utf-8") as f:
+        alignment = json.load(f)
+
+    starts = alignment.get("character_start_times_seconds") or []
+    ends = alignment.get("character_end_times_seconds") or []
+    lines = []
+    offset = 0
+    for j, text in zip(line_indexes, texts):
+        first, last = offset, offset + len(text) - 1
+        if last < len(starts) and last < len(ends):
+            lines.append({"index": j, "start": starts[first], "end": ends[last]})
+        offset += len(text) + 1
+
+    alignment["lines"] = lines
+    with open(alignment_file, "w", encoding="utf-8") as f:
+        json.dump(alignment, f)
+
+@timed("segment_tts")
+def synthesize_dialogue_lines(segment_number, dialogue, host_voice_id, expert_voice_id,
+                              rate_limiter, max_workers=None, use_cache=None, manifest=None,
+                              batch_max_chars=None, workspace=None, chunk_max_chars=None,
+                              retake_lines=()):
+    """
+    Generate audio for every line of a segment using a bounded worker pool
+    Returns the synthesis units in dialogue order (file, gap_after, lines, texts, speaker),
+    or None if any line failed; gap_after is False between the chunks of a long line that was split.
+    With batching on, a file can hold several consecutive lines of one speaker
+    and is named after the first of them.
+    Lines the manifest already records as done are not synthesized again
+    Line indexes in retake_lines get a new take instead of the cached audio
+    Unset options default to the TTS_* settings at the time of the call
+    """
+    max_workers = max_workers or TTS_MAX_CONCURRENCY
+    workspace = workspace or default_workspace
+    os.makedirs(workspace.temp_dir, exist_ok=True)
+    failed = threading.Event()
+
+    def synthesize(unit):
+        # Audio recorded for this line index is only reused if it was made from the same request
+        digest = DiskCache.make_key(unit["text"], unit["voice_id"],
+                                    unit.get("previous_text"), unit.get("next_text"))
+        if manifest and manifest.completed_line(segment_number, unit["key"], digest) == unit["file"]:
+            return True
+
+        merged = len(unit["lines"]) > 1
+        with_timestamps = (merged and TTS_BATCH_ALIGNMENT) or TTS_WORD_TIMINGS
+        context = {}
+        if TTS_CHUNK_CONTEXT and "chunk" in unit:
+            context = {"previous_text": unit["previous_text"], "next_text": unit["next_text"]}
+        retake = any(j in retake_lines for j in unit["lines"])
+        if not generate_audio_for_line(unit["text"], unit["voice_id"], unit["file"],
+                                       rate_limiter=rate_limiter, use_cache=use_cache,
+                                       with_timestamps=with_timestamps, retake=retake, **context):
+            failed.set()
+            return False
+        if with_timestamps:
+            split_alignment(alignment_file_for(unit["file"]), unit["lines"], unit["texts"])
+
+        if manifest:
+            manifest.record_line(segment_number, unit["key"], unit["file"], digest)
+        return True
+
+    units = []
+    futures = []
+    # Workers record into the metrics of the job that started them
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), initializer=_set_thread_metrics,
+                                  initargs=(current_metrics(),))
+    try:
+        # Submit each unit as soon as it is complete; dialogue may still be streaming in
+        for unit in batch_dialogue_lines(dialogue, batch_max_chars, chunk_max_chars):
+            if failed.is_set():
+                break
+            # Choose voice based on speaker
+            unit["voice_id"] = host_voice_id if unit["speaker"] == "HOST" else expert_voice_id
+            unit["file"] = workspace.line_file(segment_number, unit["lines"][0], tts_file_extension(),
+                                               unit.get("chunk"))
+            units.append(unit)
+            futures.append(executor.submit(synthesize, unit))
+
+        merged = sum(len(unit["lines"]) - 1 for unit in units)
+        if merged:
+            print(f"  → Merged {merged} lines into neighbouring requests ({len(units)} requests)")
+        split = sum(1 for unit in units if unit.get("chunk"))
+        if split:
+            print(f"  → Split long lines into {split} extra requests")
+
+        # Wait in dialogue order so progress reads like the script
+        for unit, future in zip(units, futures):
+            if not future.result():
+                print(f"  ❌ Failed to generate audio for line {unit['lines'][0]}")
+                return None
+            if unit.get("chunk"):
+                continue  # Already shown with the first chunk of its line
+            text = unit["text"]
+            print(f"    {unit['speaker']}: {text[:50]}{'...' if len(text) > 50 else ''}")
+    finally:
+        # Drop queued lines after a failure; lines already in flight finish
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return units
+
+def _save_script(segment_number, script, manifest=None, workspace=None):
+    script_filename = (workspace or default_workspace).script_file(segment_number)
+    with open(script_filename, "w", encoding="utf-8") as f:
+        f.write(script)
+    print(f"  ✅ [segment {segment_number}] Script saved: {script_filename}")
+    if manifest:
+        manifest.record(segment_number, "script_file", script_filename)
+
+@timed("script")
+def generate_segment_script(segment_number, seg, manifest=None, on_line=None, fresh=False,
+                            workspace=None):
+    """
+    Write the script for one segment with the LLM and parse it into dialogue
+    Reuses the saved dialogue or raw script when the manifest says they are done
+    If on_line is given, the script is streamed from the LLM and on_line is
+    called with each dialogue line as soon as it has been written
+    fresh=True skips the LLM response cache
+    """
+    workspace = workspace or default_workspace
+    i = segment_number
+    emit = on_line or (lambda line: None)
+
+    if manifest:
+        dialogue_json_file = manifest.completed_file(i, "dialogue_file")
+        if dialogue_json_file:
+            with open(dialogue_json_file, "r", encoding="utf-8") as f:
+                dialogue = json.load(f)
+            print(f"  ♻️  [segment {i}] Reusing saved dialogue ({len(dialogue)} lines)")
+            for line in dialogue:
+                emit(line)
+            return dialogue
+
+    saved_script = manifest.completed_file(i, "script_file") if manifest else None
+    if manifest and not saved_script:
+        # A new script is coming; line audio from an earlier, unfinished one doesn't belong to it
+        manifest.record(i, "lines", {})
+
+    if saved_script:
+        print(f"  ♻️  [segment {i}] Reusing saved script")
+        with open(saved_script, "r", encoding="utf-8") as f:
+            script = f.read()
+        dialogue = parse_dialogue_json(script)
+
+        if not dialogue:
+            # Don't get stuck on a bad saved script; ask the LLM for a new one
+            manifest.record(i, "script_file", None)
+            return generate_segment_script(i, seg, manifest, on_line, fresh, workspace)
+        for line in dialogue:
+            emit(line)
+
+    elif on_line:
+        print(f"  → [segment {i}] Streaming script from LLM...")
+        parser = JsonArrayStreamParser()
+        pieces = []
+        dialogue = []
+
+        def accept(objects):
+            for obj in objects:
+                if is_dialogue_line(obj):
+                    dialogue.append(obj)
+                    on_line(obj)
+
+        for chunk in call_llm_stream(seg['prompt_template'], use_cache=LLM_CACHE_ENABLED and not fresh,
+                                     system_instruction=seg.get("system_instruction")):
+            pieces.append(chunk)
+            accept(parser.feed(chunk))
+        accept(parser.close())
+
+        script = "".join(pieces)
+        _save_script(i, script, manifest, workspace)
+
+        if not dialogue:
+            # Not JSON at all; try the plain-text fallback on the whole script
+            dialogue = parse_dialogue_json(script)
+            for line in dialogue or []:
+                on_line(line)
+
+    else:
+        # Generate the script from the prompt using Gemini
+        print(f"  → [segment {i}] Creating script with LLM...")
+        script = call_llm(seg['prompt_template'], use_cache=LLM_CACHE_ENABLED and not fresh,
+                          system_instruction=seg.get("system_instruction"))
+        _save_script(i, script, manifest, workspace)
+        dialogue = parse_dialogue_json(script)
+
+    if not dialogue:
+        print(f"  ❌ Failed to parse dialogue for segment {i}")
+        return None
+
+    # Save parsed dialogue as JSON
+    dialogue_json_file = workspace.dialogue_file(i)
+    with open(dialogue_json_file, "w", encoding="utf-8") as f:
+        json.dump(dialogue, f, indent=2)
+    print(f"  ✅ [segment {i}] Parsed {len(dialogue)} dialogue lines")
+    if manifest:
+        manifest.record(i, "dialogue_file", dialogue_json_file)
+
+    return dialogue
+
+class LiveDialogue:
+    """
+    Dialogue of a segment that the LLM is still writing.
+    Iterating yields lines as they are parsed and stops when the script is done;
+    failed is set afterwards if the script could not be completed.
+    """
+
+    def __init__(self):
+        self._lines = queue.Queue()
+        self.failed = False
+
+    def add(self, line):
+        self._lines.put(line)
+
+    def finish(self, ok=True):
+        self.failed = not ok
+        self._lines.put(_PIPELINE_DONE)
+
+    def __iter__(self):
+        while True:
+            line = self._lines.get()
+            if line is _PIPELINE_DONE:
+                return
+            yield line
+
+@timed("segment_mix")
+def mix_segment_audio(segment_number, line_audio_files, manifest=None, workspace=None):
+    """
+    Combine the line audio files of one segment into a single segment file
+    line_audio_files holds the units from synthesize_dialogue_lines; chunks of one line
+    are spliced without a pause. Where each line lands is saved as the segment transcript.
+    """
+    workspace = workspace or default_workspace
+    i = segment_number
+
+    print(f"  → [segment {i}] Combining {len(line_audio_files)} audio lines...")
+    try:
+        # Stream each line into the encoder instead of growing one AudioSegment
+        segment_filename = workspace.segment_audio_file(i)
+        # PCM lines are used at their own rate; anything else is decoded to AUDIO_SAMPLE_RATE
+        line_sample_rate = tts_pcm_sample_rate() or AUDIO_SAMPLE_RATE
+        placements = []
+        with StreamingAudioWriter(segment_filename, workspace.profile, sample_rate=line_sample_rate) as writer:
+            for unit in line_audio_files:
+                start = writer.duration_ms / 1000
+                writer.append_file(unit["file"])
+                placements.append((unit, start, writer.duration_ms / 1000))
+                # Add a small pause between lines
+                if unit["gap_after"]:
+                    writer.append_silence(LINE_PAUSE_MS)
+
+        print(f"  ✅ Segment audio saved: {segment_filename}")
+        transcript_file = workspace.segment_transcript_file(i)
+        with open(transcript_file, "w", encoding="utf-8") as f:
+            json.dump({"segment": i, "lines": segment_cues(placements)}, f)
+        if manifest:
+            # Segments are joined as encoded, so their encoded length is what plays
+            duration = encoded_duration(segment_filename, workspace.profile)
+            manifest.record(i, "duration_ms", round(duration * 1000 if duration else writer.duration_ms))
+            manifest.record(i, "transcript_file", transcript_file)
+            manifest.record(i, "audio_file", segment_filename)
+        return segment_filename
+
+    except Exception as e:
+        print(f"  ❌ Error combining audio lines: {str(e)}")
+        return None
+
+# Marks the end of a pipeline queue
+_PIPELINE_DONE = object()
+
+def _queue_put(q, item, stop):
+    """Put into a bounded queue, giving up if the pipeline was stopped"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _queue_get(q, stop):
+    """Get from a queue, returning _PIPELINE_DONE if the pipeline was stopped"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _PIPELINE_DONE
+
+# ==========================
+# TRANSCRIPT
+# ==========================
+def _load_alignment(audio_file):
+    try:
+        with open(alignment_file_for(audio_file), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _word_times(alignment, offset, length, base):
+    """[start, end, word] for the words in characters offset..offset+length of an alignment"""
+    chars = alignment.get("characters") or []
+    starts = alignment.get("character_start_times_seconds") or []
+    ends = alignment.get("character_end_times_seconds") or []
+    words = []
+    word = None
+    for k in range(offset, min(offset + length, len(chars), len(starts), len(ends))):
+        if chars[k].isspace():
+            word = None
+        elif word is None:
+            word = [base + starts[k], base + ends[k], chars[k]]
+            words.append(word)
+        else:
+            word[1] = base + ends[k]
+            word[2] += chars[k]
+    return words
+
+def segment_cues(placements):
+    """
+    Per-line timings of one segment
+    placements holds (unit, start, end) with each unit's position in the segment in seconds.
+    A unit holding several lines is split with its character timings if it has them,
+    otherwise in proportion to the lines' length.
+    """
+    cues = {}
+    for unit, start, end in placements:
+        alignment = _load_alignment(unit["file"])
+        total_chars = sum(len(text) for text in unit["texts"]) or 1
+        offset = 0
+        position = start
+        for j, text in zip(unit["lines"], unit["texts"]):
+            words = _word_times(alignment, offset, len(text), start) if alignment else []
+            if words:
+                line_start, line_end = words[0][0], words[-1][1]
+            else:
+                line_start = position
+                line_end = position + (end - start) * len(text) / total_chars
+            position = line_end
+            offset += len(text) + 1
+
+            cue = cues.get(j)
+            if cue is None:
+                cues[j] = {"line": j, "speaker": unit["speaker"], "text": text,
+                           "start": line_start, "end": line_end, "words": words}
+            else:
+                # Next chunk of a line that was split
+                cue["text"] += " " + text
+                cue["end"] = line_end
+                cue["words"] += words
+    return [cues[j] for j in sorted(cues)]
+
+def _vtt_time(seconds):
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    return f"{hours:02d}:{minutes:02d}:{millis / 1000:06.3f}"
+
+def write_transcript(segment_count, manifest, workspace):
+    """
+    Write the episode's time-indexed transcript from the segment transcripts
+    transcript.json: "lines" in playback order with start/end seconds (and "words" as
+    [start, end, word] where known), plus "starts", the sorted line start times, so a
+    player can binary-search the line at any position.
+    transcript.vtt: the same lines as WebVTT cues.
+    """
+    lines = []
+    offset = 0.0
+    for n in range(1, segment_count + 1):
+        transcript_file = manifest.completed_file(n, "transcript_file")
+        if transcript_file:
+            with open(transcript_file, "r", encoding="utf-8") as f:
+                cues = json.load(f)["lines"]
+            for cue in cues:
+                line = {"segment": n, "speaker": cue["speaker"], "text": cue["text"],
+                        "start": round(offset + cue["start"], 3), "end": round(offset + cue["end"], 3)}
+                if cue.get("words"):
+                    line["words"] = [[round(offset + s, 3), round(offset + e, 3), w]
+                                     for s, e, w in cue["words"]]
+                lines.append(line)
+        offset += manifest.value(n, "duration_ms", 0) / 1000
+
+    with open(workspace.transcript_file, "w", encoding="utf-8") as f:
+        json.dump({"duration": round(offset, 3), "starts": [line["start"] for line in lines],
+                   "lines": lines}, f, ensure_ascii=False, separators=(",", ":"))
+
+    vtt = ["WEBVTT", ""]
+    for k, line in enumerate(lines, 1):
+        text = line["text"].replace("&", "&amp;").replace("<", "&lt;")
+        vtt += [str(k), f"{_vtt_time(line['start'])} --> {_vtt_time(line['end'])}",
+                f"<v {line['speaker']}>{text}", ""]
+    with open(workspace.transcript_vtt_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vtt))
+    print(f"📝 Transcript: {workspace.transcript_file} ({len(lines)} lines)")
+
+def assemble_episode(segment_files, manifest, workspace):
+    """
+    Join the segment files into the workspace's full episode and record its
+    delivery report in the manifest. Returns the episode file or None.
+    """
+    combined_file = combine_audio_segments(segment_files, workspace.full_audio_file, workspace.profile)
+    if combined_file:
+        duration = sum(manifest.value(i, "duration_ms", 0) for i in range(1, len(segment_files) + 1)) / 1000
+        report = delivery_report(combined_file, duration, workspace.profile)
+        manifest.data["delivery"] = report
+        current_metrics().incr("delivery_bytes", report["bytes"])
+        print(f"📦 {report['profile']}: {report['bytes'] / (1024 * 1024):.1f} MB for "
+              f"{int(duration // 60)}:{int(duration % 60):02d} ({report['bitrate_kbps']} kbps)")
+        if manifest.data.get("total_minutes"):
+            target = manifest.data["total_minutes"] * 60
+            print(f"⏱️  {(duration - target) / target:+.0%} against the "
+                  f"{manifest.data['total_minutes']} minute target")
+        write_transcript(len(segment_files), manifest, workspace)
+    return combined_file
+
+@with_workspace
+def generate_segments_and_combine(topic, podcast_prompts, use_cache=None, resume=True,
+                                  fresh=False, on_progress=None, rate_limiter=None, workspace=None):
     """
     Generate each segment separately using text-to-speech with proper voice switching
     Uses JSON dialogue format to separate HOST and EXPERT voices
+
+    Runs as a three-stage pipeline: scripts are written by the LLM up to
+    SCRIPT_LOOKAHEAD segments ahead while earlier segments are voiced and mixed.
+    With LLM_STREAMING, lines are voiced while their segment is still being written.
+    Pass use_cache=False to skip the TTS cache and re-synthesize every line.
+    With resume=True, units already recorded in the workspace's job manifest
+    (scripts, dialogue, line audio, segment audio) are reused.
+    fresh=True asks the LLM for new scripts instead of using its response cache.
+    on_progress(segments_done, segments_total) is called as each segment is mixed.
+    Pass a rate_limiter to share one TTS budget between episodes.
+    All files go to the workspace (output/ by default).
     """
+    if use_cache is None:
+        use_cache = TTS_CACHE_ENABLED
     
-    if not elevenlabs_api_key:
+    if not get_config().elevenlabs_api_key:
         print("❌ ElevenLabs API key not configured!")
         return None
     
@@ -736,156 +3152,670 @@ def generate_segments_and_combine(topic, podcast_prompts):
     
     print("\n🎙️ Generating podcast segments with ElevenLabs TTS...")
     
-    # Voice configuration - change these to customize
-    host_voice_id = "21m00Tcm4TlvDq8ikWAM"  # Rachel (female)
-    expert_voice_id = "29vD33N1CtxCmqQRPOHJ"  # Drew (male)
+    # Voice configuration - change HOST_VOICE_ID / EXPERT_VOICE_ID or configure() to customize
+    host_voice_id = get_config().host_voice_id
+    expert_voice_id = get_config().expert_voice_id
     
     segment_files = []
-    
-    for i, seg in enumerate(podcast_prompts, 1):
-        print(f"\n📝 Generating segment {i}/{len(podcast_prompts)}...")
-        
-        # Generate the script from the prompt using Gemini
-        print(f"  → Creating script with LLM...")
-        script = call_llm(seg['prompt_template'])
-        
-        # Save the raw script
-        script_filename = f"output/prompts/segment_{i:02d}_script.txt"
-        with open(script_filename, "w", encoding="utf-8") as f:
-            f.write(script)
-        print(f"  ✅ Script saved: {script_filename}")
-        
-        # Parse the JSON dialogue
-        print(f"  → Parsing dialogue...")
-        dialogue = parse_dialogue_json(script)
-        
-        if not dialogue:
-            print(f"  ❌ Failed to parse dialogue for segment {i}")
-            return None
-        
-        # Save parsed dialogue as JSON
-        dialogue_json_file = f"output/prompts/segment_{i:02d}_dialogue.json"
-        with open(dialogue_json_file, "w", encoding="utf-8") as f:
-            json.dump(dialogue, f, indent=2)
-        print(f"  ✅ Parsed {len(dialogue)} dialogue lines")
-        
-        # Generate audio for each line
-        print(f"  → Generating audio for each line...")
-        line_audio_files = []
-        
-        for j, line in enumerate(dialogue):
-            speaker = line.get("speaker", "EXPERT")
-            text = line.get("text", "")
-            
-            if not text:
-                continue
-            
-            # Choose voice based on speaker
-            voice_id = host_voice_id if speaker == "HOST" else expert_voice_id
-            
-            # Generate audio file for this line
-            line_audio_file = f"output/temp/segment_{i:02d}_line_{j:03d}.mp3"
-            os.makedirs("output/temp", exist_ok=True)
-            
-            print(f"    {speaker}: {text[:50]}{'...' if len(text) > 50 else ''}")
-            
-            if generate_audio_for_line(text, voice_id, line_audio_file):
-                line_audio_files.append(line_audio_file)
-            else:
-                print(f"  ❌ Failed to generate audio for line {j}")
-                return None
-            
-            # Delay to avoid rate limits (especially important for free tier)
-            time.sleep(API_DELAY_SECONDS)
-        
-        # Combine all lines into one segment
-        print(f"  → Combining {len(line_audio_files)} audio lines...")
+
+    # One limiter for the whole episode so every worker shares the same budget
+    rate_limiter = rate_limiter or RateLimiter()
+
+    manifest = JobManifest.load(workspace.manifest_file)
+    if not (resume and manifest.matches_segments(topic, podcast_prompts)):
+        manifest = JobManifest(workspace.manifest_file, data={"topic": topic})
+        manifest.set_segments(podcast_prompts)
+    manifest.set_status("generating")
+
+    # Publish segments as they finish so the player can start early
+    stream = EpisodeStream(workspace.root, profile=workspace.profile)
+    job_metrics = current_metrics()
+
+    # Bounded queues between stages keep at most a few segments in flight
+    stop = threading.Event()
+    scripts = queue.Queue(maxsize=max(1, SCRIPT_LOOKAHEAD))
+    voiced = queue.Queue(maxsize=1)
+
+    def write_scripts():
+        _set_thread_metrics(job_metrics)
+        live = None
+        words_written = 0
         try:
-            segment_audio = AudioSegment.empty()
-            
-            for line_file in line_audio_files:
-                audio = AudioSegment.from_mp3(line_file)
-                segment_audio += audio
-                # Add a small pause between lines (300ms)
-                segment_audio += AudioSegment.silent(duration=300)
-            
-            # Save the complete segment
-            segment_filename = f"output/segment_{i:02d}_audio.mp3"
-            segment_audio.export(segment_filename, format="mp3")
-            segment_files.append(segment_filename)
-            print(f"  ✅ Segment audio saved: {segment_filename}")
-            
+            for i, seg in enumerate(podcast_prompts, 1):
+                if i > 1 and i == len(podcast_prompts) and not manifest.completed_file(i, "dialogue_file"):
+                    seg = fit_final_segment(seg, podcast_prompts, words_written)
+                if LLM_STREAMING:
+                    # Hand the segment to the voice stage first, then fill it line by line
+                    live = LiveDialogue()
+                    if not _queue_put(scripts, (i, live), stop):
+                        return
+                    dialogue = generate_segment_script(i, seg, manifest, on_line=live.add, fresh=fresh,
+                                                       workspace=workspace)
+                    live.finish(dialogue is not None)
+                    live = None
+                else:
+                    dialogue = generate_segment_script(i, seg, manifest, fresh=fresh, workspace=workspace)
+                    if dialogue is not None and not _queue_put(scripts, (i, dialogue), stop):
+                        return
+                if dialogue is None:
+                    stop.set()
+                    return
+                words_written += sum(len(line.get("text", "").split()) for line in dialogue)
+                pace_model.observe_dialogue(dialogue)
+            _queue_put(scripts, _PIPELINE_DONE, stop)
         except Exception as e:
-            print(f"  ❌ Error combining audio lines: {str(e)}")
-            return None
+            print(f"  ❌ Error creating script: {str(e)}")
+            stop.set()
+            if live:
+                live.finish(False)
+
+    def mix_segments():
+        _set_thread_metrics(job_metrics)
+        try:
+            while True:
+                item = _queue_get(voiced, stop)
+                if item is _PIPELINE_DONE:
+                    return
+                i, line_audio_files = item
+                if line_audio_files is None:
+                    # Segment audio was already finished by an earlier run
+                    segment_filename = manifest.completed_file(i, "audio_file")
+                else:
+                    segment_filename = mix_segment_audio(i, line_audio_files, manifest, workspace)
+                if segment_filename is None:
+                    stop.set()
+                    return
+                segment_files.append(segment_filename)
+                pace_model.save()
+                stream.add_segment(i, segment_filename, manifest.value(i, "duration_ms", 0) / 1000)
+                # The player can start once the first segment is published
+                current_metrics().mark("first_audio")
+                if on_progress:
+                    on_progress(len(segment_files), len(podcast_prompts))
+        except Exception as e:
+            # Stop the other stages too, or the voice stage waits on this one forever
+            print(f"  ❌ Error mixing segment audio: {str(e)}")
+            stop.set()
+
+    script_thread = threading.Thread(target=write_scripts, name="script-stage", daemon=True)
+    mix_thread = threading.Thread(target=mix_segments, name="mix-stage", daemon=True)
+    script_thread.start()
+    mix_thread.start()
+
+    # Voice stage runs on this thread
+    completed = False
+    try:
+        while True:
+            item = _queue_get(scripts, stop)
+            if item is _PIPELINE_DONE:
+                break
+            i, dialogue = item
+
+            if manifest.completed_file(i, "audio_file"):
+                print(f"\n♻️  Segment {i}/{len(podcast_prompts)} audio already generated")
+                if not _queue_put(voiced, (i, None), stop):
+                    break
+                continue
+
+            print(f"\n📝 Generating audio for segment {i}/{len(podcast_prompts)} "
+                  f"({TTS_MAX_CONCURRENCY} lines in parallel)...")
+            line_audio_files = synthesize_dialogue_lines(
+                i, dialogue, host_voice_id, expert_voice_id, rate_limiter,
+                use_cache=use_cache, manifest=manifest, workspace=workspace
+            )
+
+            if line_audio_files is None or getattr(dialogue, "failed", False):
+                stop.set()
+                break
+            if not _queue_put(voiced, (i, line_audio_files), stop):
+                break
+
+        _queue_put(voiced, _PIPELINE_DONE, stop)
+        completed = True
+    finally:
+        if not completed:
+            # Raised on this thread; stop the other stages before the exception propagates
+            stop.set()
+        script_thread.join()
+        mix_thread.join()
+        if not completed:
+            manifest.set_status("failed")
+            stream.finish(status="failed")
+
+    if stop.is_set() or len(segment_files) != len(podcast_prompts):
+        manifest.set_status("failed")
+        stream.finish(status="failed")
+        current_metrics().write_report(workspace.root)
+        print("  💡 Progress saved. Run again with the same topic to resume.")
+        return None
     
     # Clean up temporary files
     print(f"\n🧹 Cleaning up temporary files...")
     try:
-        import shutil
-        if os.path.exists("output/temp"):
-            shutil.rmtree("output/temp")
+        workspace.clean_temp()
         print(f"  ✅ Temporary files removed")
     except Exception as e:
         print(f"  ⚠️  Could not remove temp files: {e}")
     
     # Combine all segments
     print(f"\n✅ All {len(segment_files)} segments generated!")
+    counters = current_metrics().report()["counters"]
+    if use_cache:
+        print(f"💾 TTS cache: {counters.get('tts_cache_hits', 0)} hits, "
+              f"{counters.get('tts_cache_misses', 0)} misses")
+    if not fresh:
+        print(f"💾 LLM cache: {counters.get('llm_cache_hits', 0)} hits, "
+              f"{counters.get('llm_requests', 0)} requests")
     
     # Combine into final podcast
-    combined_file = combine_audio_segments(segment_files)
+    combined_file = assemble_episode(segment_files, manifest, workspace)
     
+    print(f"📊 Metrics saved: {current_metrics().write_report(workspace.root)}")
+
     if combined_file:
+        manifest.data["audio_file"] = combined_file
+        manifest.set_status("complete")
+        stream.finish(full_audio=combined_file)
         print(f"\n🎉 Final podcast: {combined_file}")
     else:
+        stream.finish()
         print("📝 Individual segment files saved:")
         for sf in segment_files:
             print(f"   - {sf}")
     
     return segment_files
 
+# ==========================
+# RE-RENDER ONE SEGMENT
+# ==========================
+def _tts_cached(unit):
+    """True if the TTS cache holds the audio for a unit from batch_dialogue_lines"""
+    config = get_config()
+    voice_id = config.host_voice_id if unit["speaker"] == "HOST" else config.expert_voice_id
+    context = ()
+    if TTS_CHUNK_CONTEXT and "chunk" in unit:
+        context = (unit["previous_text"], unit["next_text"])
+    key = tts_cache_key(unit["text"], voice_id, *context)
+    return os.path.exists(tts_cache.path_for(key, tts_file_extension()))
+
+@with_workspace
+def rerender_segment(segment_number, retake_lines=(), rewrite=False, use_cache=None, workspace=None):
+    """
+    Redo one segment of a finished episode and splice it back in
+    The dialogue comes from the saved segment_XX_dialogue.json, so lines can be fixed
+    by editing that file; rewrite=True asks the LLM for a new script instead.
+    Lines whose text is unchanged are served from the TTS cache, so only edited lines
+    are sent to ElevenLabs; line indexes in retake_lines get a new take anyway.
+    The finished episode keeps no line audio, so with the cache off (use_cache defaults
+    to TTS_CACHE_ENABLED) or its entries evicted, those lines are voiced again too;
+    how many is printed before anything is sent.
+    The other segments are left as they are and the episode is joined again.
+    Returns the full episode file, or None on failure.
+    """
+    i = segment_number
+    manifest = JobManifest.load(workspace.manifest_file)
+    numbers = [seg.get("segment") for seg in manifest.data.get("segments", [])]
+    if i not in numbers:
+        print(f"❌ No segment {i} in {workspace.manifest_file}")
+        return None
+    current_metrics().reset()
+    print(f"\n✂️  Re-rendering segment {i}/{len(numbers)} of \"{manifest.data.get('topic')}\"")
+
+    if rewrite:
+        if not os.path.exists(workspace.prompt_file(i)):
+            print(f"❌ Prompt not found: {workspace.prompt_file(i)}")
+            return None
+        with open(workspace.prompt_file(i), "r", encoding="utf-8") as f:
+            seg = {"prompt_template": f.read(), "system_instruction": None}
+        system_file = workspace.path("prompts", "system_instruction.txt")
+        if os.path.exists(system_file):
+            with open(system_file, "r", encoding="utf-8") as f:
+                seg["system_instruction"] = f.read()
+        manifest.record(i, "dialogue_file", None)
+        manifest.record(i, "script_file", None)
+        dialogue = generate_segment_script(i, seg, manifest, fresh=True, workspace=workspace)
+    else:
+        dialogue_file = manifest.completed_file(i, "dialogue_file")
+        if not dialogue_file:
+            print(f"❌ No saved dialogue for segment {i}")
+            return None
+        with open(dialogue_file, "r", encoding="utf-8") as f:
+            dialogue = json.load(f)
+    if not dialogue:
+        return None
+    if use_cache is None:
+        use_cache = TTS_CACHE_ENABLED
+
+    units = list(batch_dialogue_lines(dialogue))
+    if not use_cache:
+        print(f"⚠️  TTS cache is off: all {len(units)} requests of segment {i} go to ElevenLabs")
+    else:
+        uncached = sum(1 for unit in units if not _tts_cached(unit))
+        if uncached:
+            print(f"⚠️  {uncached} of {len(units)} requests are not in the TTS cache "
+                  f"(edited, or evicted) and go to ElevenLabs")
+
+    # Line audio left from an earlier run may be for the old text
+    manifest.record(i, "lines", {})
+    line_audio_files = synthesize_dialogue_lines(
+        i, dialogue, get_config().host_voice_id, get_config().expert_voice_id, RateLimiter(),
+        use_cache=use_cache, manifest=manifest, workspace=workspace, retake_lines=set(retake_lines)
+    )
+    if line_audio_files is None:
+        return None
+    if not mix_segment_audio(i, line_audio_files, manifest, workspace):
+        return None
+    workspace.clean_temp()
+
+    segment_files = [manifest.completed_file(n, "audio_file") for n in numbers]
+    if None in segment_files:
+        print("⚠️  Segment saved, but other segments are missing; the episode was not joined")
+        return None
+    combined_file = assemble_episode(segment_files, manifest, workspace)
+    if combined_file:
+        stream = EpisodeStream(workspace.root, profile=workspace.profile)
+        for n, segment_file in zip(numbers, segment_files):
+            stream.add_segment(n, segment_file, manifest.value(n, "duration_ms", 0) / 1000)
+        stream.finish(full_audio=combined_file)
+        manifest.data["audio_file"] = combined_file
+        manifest.set_status("complete")
+        print(f"\n🎉 Updated podcast: {combined_file}")
+    current_metrics().write_report(workspace.root)
+    return combined_file
+
+# ==========================
+# SERVICE MODE
+# ==========================
+class PodcastService:
+    """
+    Resident generator: a queue of jobs worked off by a pool of threads.
+    The LLM client, HTTP session and caches stay loaded between jobs.
+    Every job gets its own workspace under jobs_dir, so jobs run in parallel,
+    and all jobs share one TTS rate limiter since they share one API account.
+    Finished jobs are forgotten and their workspaces deleted after job_ttl seconds,
+    or sooner, oldest first, when more than max_finished are kept.
+    """
+
+    def __init__(self, workers=SERVICE_WORKERS, max_queued=SERVICE_MAX_QUEUED,
+                 jobs_dir=SERVICE_JOBS_DIR, job_ttl=SERVICE_JOB_TTL,
+                 max_finished=SERVICE_MAX_FINISHED_JOBS):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=max_queued)
+        self.jobs_dir = jobs_dir
+        self.job_ttl = job_ttl
+        self.max_finished = max_finished
+        self.rate_limiter = RateLimiter()
+        self.workers = [
+            threading.Thread(target=self._work, name=f"service-worker-{n + 1}", daemon=True)
+            for n in range(max(1, workers))
+        ]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def submit(self, topic, minutes, profile=None):
+        """Queue a new episode; returns its status, or None if the queue is full"""
+        self.prune()
+        profile = profile or DELIVERY_PROFILE
+        job_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.jobs[job_id] = {
+                "id": job_id,
+                "topic": topic,
+                "minutes": minutes,
+                "profile": profile,
+                "status": "queued",
+                "segments_done": 0,
+                "segments_total": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "audio_file": None
+            }
+        try:
+            self.pending.put_nowait(job_id)
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+            return None
+        return self.status(job_id)
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            status = {key: value for key, value in job.items() if key != "audio_file"}
+        status["audio_url"] = f"/jobs/{job_id}/audio" if job["audio_file"] else None
+        status["transcript_url"] = f"/jobs/{job_id}/transcript" if job["audio_file"] else None
+        # Segments can be played as soon as the job starts publishing them
+        workspace = self.workspace(job_id)
+        publishing = os.path.exists(workspace.stream_file)
+        status["stream_url"] = f"/jobs/{job_id}/stream.json" if publishing else None
+        status["playlist_url"] = (f"/jobs/{job_id}/podcast.m3u8"
+                                  if publishing and os.path.exists(workspace.playlist_file) else None)
+        return status
+
+    def workspace(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            profile = job and job["profile"]
+        return Workspace(os.path.join(self.jobs_dir, job_id), profile=profile)
+
+    def list_jobs(self):
+        with self.lock:
+            job_ids = list(self.jobs)
+        return [self.status(job_id) for job_id in job_ids]
+
+    def audio_file(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job and job["audio_file"]
+
+    def prune(self, now=None):
+        """Drop expired finished jobs and delete their workspaces; returns the dropped ids"""
+        now = now or time.time()
+        with self.lock:
+            finished = sorted((job for job in self.jobs.values() if job["finished_at"]),
+                              key=lambda job: job["finished_at"])
+            expired = [job for job in finished
+                       if self.job_ttl is not None and now - job["finished_at"] > self.job_ttl]
+            excess = len(finished) - len(expired) - self.max_finished
+            if excess > 0:
+                expired += finished[len(expired):len(expired) + excess]
+            for job in expired:
+                del self.jobs[job["id"]]
+        # Outside the lock; deleting a long episode's files takes a moment
+        for job in expired:
+            shutil.rmtree(os.path.join(self.jobs_dir, job["id"]), ignore_errors=True)
+        return [job["id"] for job in expired]
+
+    def _update(self, job_id, **changes):
+        with self.lock:
+            self.jobs[job_id].update(changes)
+
+    def _work(self):
+        while True:
+            job_id = self.pending.get()
+            try:
+                self._run(job_id)
+            finally:
+                self.pending.task_done()
+                self.prune()
+
+    def _run(self, job_id):
+        with self.lock:
+            job = self.jobs[job_id]
+            topic, minutes = job["topic"], job["minutes"]
+        workspace = self.workspace(job_id)
+        try:
+            self._update(job_id, status="planning", started_at=time.time())
+            podcast_prompts = build_podcast(topic, minutes, workspace=workspace)
+            save_podcast(topic, podcast_prompts, workspace=workspace)
+
+            self._update(job_id, status="generating", segments_total=len(podcast_prompts))
+            segment_files = generate_segments_and_combine(
+                topic, podcast_prompts, rate_limiter=self.rate_limiter, workspace=workspace,
+                on_progress=lambda done, total: self._update(job_id, segments_done=done)
+            )
+            audio_file = JobManifest.load(workspace.manifest_file).data.get("audio_file")
+            if not segment_files or not audio_file:
+                raise RuntimeError("audio generation failed")
+
+            self._update(job_id, status="complete", audio_file=audio_file, finished_at=time.time())
+            print(f"✅ Job {job_id} complete: {audio_file}")
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            print(f"❌ Job {job_id} failed: {str(e)}")
+
+_SEGMENT_AUDIO_NAME = re.compile(r"segment_\d{2,}_audio\.\w+")
+
+def _is_published(workspace, name):
+    """True if the workspace's stream.json lists the segment file name"""
+    try:
+        with open(workspace.stream_file, "r", encoding="utf-8") as f:
+            return any(seg["file"] == name for seg in json.load(f)["segments"])
+    except (OSError, ValueError, KeyError):
+        return False
+
+def _service_handler(service):
+    """Request handler class bound to a PodcastService"""
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                topic = str(request.get("topic", "")).strip()
+                minutes = int(request.get("minutes", 0))
+                profile = request.get("profile") or DELIVERY_PROFILE
+            except (ValueError, TypeError, AttributeError):
+                self._send_json(400, {"error": "expected JSON with topic and minutes"})
+                return
+            if not topic or minutes <= 0:
+                self._send_json(400, {"error": "topic and a positive number of minutes are required"})
+                return
+            if minutes > SERVICE_MAX_MINUTES:
+                self._send_json(400, {"error": f"minutes can be at most {SERVICE_MAX_MINUTES}"})
+                return
+            if profile not in DELIVERY_PROFILES:
+                self._send_json(400, {"error": f"profile must be one of {', '.join(DELIVERY_PROFILES)}"})
+                return
+
+            job = service.submit(topic, minutes, profile)
+            if job is None:
+                self._send_json(503, {"error": "too many jobs waiting, try again later"})
+                return
+            self._send_json(202, job)
+
+        def do_GET(self):
+            parts = [part for part in self.path.split("?")[0].split("/") if part]
+            if parts == ["health"]:
+                self._send_json(200, {"status": "ok", "queued": service.pending.qsize(),
+                                      "workers": len(service.workers)})
+            elif parts == ["jobs"]:
+                self._send_json(200, {"jobs": service.list_jobs()})
+            elif len(parts) == 2 and parts[0] == "jobs":
+                job = service.status(parts[1])
+                if job is None:
+                    self._send_json(404, {"error": "unknown job"})
+                else:
+                    self._send_json(200, job)
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "audio":
+                self._send_audio(parts[1])
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] in ("transcript", "transcript.vtt"):
+                self._send_transcript(parts[1], vtt=parts[2].endswith(".vtt"))
+            elif len(parts) == 3 and parts[0] == "jobs":
+                self._send_stream_file(parts[1], parts[2])
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _send_file(self, path, content_type, cache=True):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            if not cache:
+                self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile)
+
+        def _send_stream_file(self, job_id, name):
+            """stream.json, podcast.m3u8 and the published segment files of a job"""
+            job = service.status(job_id)
+            if job is None:
+                self._send_json(404, {"error": "unknown job"})
+                return
+            workspace = service.workspace(job_id)
+            if name == "stream.json":
+                self._send_published(job, workspace.stream_file, "application/json", cache=False)
+            elif name == "podcast.m3u8":
+                self._send_published(job, workspace.playlist_file, "application/vnd.apple.mpegurl",
+                                     cache=False)
+            elif (_SEGMENT_AUDIO_NAME.fullmatch(name) and name.endswith(workspace.audio_extension)
+                  and _is_published(workspace, name)):
+                # Until stream.json lists a segment, its file may still be being encoded
+                self._send_published(job, workspace.path(name),
+                                     DELIVERY_PROFILES[job["profile"]]["mime_type"])
+            else:
+                self._send_json(404, {"error": f"{name} is not published"})
+
+        def _send_published(self, job, path, content_type, cache=True):
+            if not os.path.exists(path):
+                self._send_json(404, {"error": f"job is {job['status']}, nothing published yet"})
+                return
+            self._send_file(path, content_type, cache)
+
+        def _send_audio(self, job_id):
+            job = service.status(job_id)
+            if job is None:
+                self._send_json(404, {"error": "unknown job"})
+                return
+            audio_file = service.audio_file(job_id)
+            if not audio_file or not os.path.exists(audio_file):
+                self._send_json(409, {"error": f"job is {job['status']}, no audio yet"})
+                return
+            delivery = DELIVERY_PROFILES[job["profile"]]
+            self.send_response(200)
+            self.send_header("Content-Type", delivery["mime_type"])
+            self.send_header("Content-Length", str(os.path.getsize(audio_file)))
+            self.send_header("Content-Disposition",
+                             f'attachment; filename="{job_id}{delivery["extension"]}"')
+            self.end_headers()
+            with open(audio_file, "rb") as f:
+                shutil.copyfileobj(f, self.wfile)
+
+        def _send_transcript(self, job_id, vtt=False):
+            job = service.status(job_id)
+            if job is None:
+                self._send_json(404, {"error": "unknown job"})
+                return
+            workspace = service.workspace(job_id)
+            path = workspace.transcript_vtt_file if vtt else workspace.transcript_file
+            if not job["audio_url"] or not os.path.exists(path):
+                self._send_json(409, {"error": f"job is {job['status']}, no transcript yet"})
+                return
+            self._send_file(path, "text/vtt" if vtt else "application/json")
+
+    return Handler
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS):
+    """
+    Run the HTTP API until interrupted
+    POST /jobs {"topic": ..., "minutes": ..., "profile": ...} queues an episode,
+    GET /jobs/<id> reports its progress and GET /jobs/<id>/audio downloads it.
+    GET /jobs/<id>/transcript (or transcript.vtt) returns the timed transcript.
+    While the job runs, GET /jobs/<id>/stream.json and /jobs/<id>/podcast.m3u8 list the
+    segments published so far, which are served from /jobs/<id>/segment_XX_audio.<ext>.
+    """
+    from http.server import ThreadingHTTPServer
+    service = PodcastService(workers=workers).start()
+    httpd = ThreadingHTTPServer((host, port), _service_handler(service))
+    httpd.daemon_threads = True
+    print(f"🌐 Podcast service listening on http://{host}:{port} ({workers} workers)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down")
+    finally:
+        httpd.server_close()
+
 # ==========================
 # MAIN
 # ==========================
 if __name__ == "__main__":
-    topic = input("What do you want to learn? ")
-    minutes = int(input("Commute duration (minutes): "))
-
-    # Generate the podcast structure and prompts
-    podcast_prompts = build_podcast(topic, minutes)
-    save_podcast(topic, podcast_prompts)
-
-    print("\n" + "="*50)
-    print("✅ Podcast prompt templates generated successfully!")
-    print(f"📁 Location: output/prompts/")
-    print(f"📊 Total segments: {len(podcast_prompts)}")
-    print("="*50)
-    
-    # Ask if user wants to generate audio with ElevenLabs
-    if elevenlabs_api_key:
-        generate_audio = input("\n🎙️ Generate audio with ElevenLabs? (y/n): ").strip().lower()
+    parser = argparse.ArgumentParser(description="Generate a two-speaker learning podcast")
+    parser.add_argument("--topic", help="what the episode should teach")
+    parser.add_argument("--minutes", type=int, help="commute duration in minutes")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore saved progress and cached LLM responses")
+    parser.add_argument("--output-dir", default="output",
+                        help="workspace folder for this episode (use one per parallel run)")
+    parser.add_argument("--profile", choices=sorted(DELIVERY_PROFILES), default=DELIVERY_PROFILE,
+                        help="delivery format of the episode")
+    parser.add_argument("--rerender", type=int, metavar="SEGMENT",
+                        help="redo one segment of the episode in --output-dir from its saved "
+                             "dialogue and join the episode again")
+    parser.add_argument("--lines", type=int, nargs="+", default=[], metavar="N",
+                        help="with --rerender: lines to record again even if unchanged (1 = first line)")
+    parser.add_argument("--rewrite", action="store_true",
+                        help="with --rerender: have the LLM write the segment's script again")
+    parser.add_argument("--serve", action="store_true", help="run the HTTP job service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    args = parser.parse_args()
+
+    workspace = Workspace(args.output_dir, profile=args.profile)
+    if args.serve:
+        serve(args.host, args.port, args.workers)
+    elif args.rerender:
+        # Keep the episode's original delivery format
+        delivery = JobManifest.load(workspace.manifest_file).data.get("delivery") or {}
+        workspace = Workspace(args.output_dir, profile=delivery.get("profile", args.profile))
+        rerender_segment(args.rerender, retake_lines=[n - 1 for n in args.lines],
+                         rewrite=args.rewrite, workspace=workspace)
+    elif args.topic and args.minutes:
+        podcast_prompts = build_podcast(args.topic, args.minutes, fresh=args.fresh, workspace=workspace)
+        save_podcast(args.topic, podcast_prompts, workspace=workspace)
+        generate_segments_and_combine(args.topic, podcast_prompts, fresh=args.fresh, workspace=workspace)
+    else:
+        # Interactive mode
+        topic = args.topic or input("What do you want to learn? ")
+        minutes = args.minutes or int(input("Commute duration (minutes): "))
+
+        # Generate the podcast structure and prompts
+        podcast_prompts = build_podcast(topic, minutes, fresh=args.fresh, workspace=workspace)
+        save_podcast(topic, podcast_prompts, workspace=workspace)
+
+        print("\n" + "="*50)
+        print("✅ Podcast prompt templates generated successfully!")
+        print(f"📁 Location: {workspace.prompts_dir}")
+        print(f"📊 Total segments: {len(podcast_prompts)}")
+        print("="*50)
+    
+        # Ask if user wants to generate audio with ElevenLabs
+        if get_config().elevenlabs_api_key:
+            generate_audio = input("\n🎙️ Generate audio with ElevenLabs? (y/n): ").strip().lower()
         
-        if generate_audio == 'y':
-            print("\n📋 Choose generation method:")
-            print("1. Generate segments separately (recommended)")
-            print("2. Generate full podcast at once")
+            if generate_audio == 'y':
+                print("\n📋 Choose generation method:")
+                print("1. Generate segments separately (recommended)")
+                print("2. Generate full podcast at once")
             
-            method = input("Enter choice (1 or 2): ").strip()
+                method = input("Enter choice (1 or 2): ").strip()
             
-            if method == "1":
-                audio_files = generate_segments_and_combine(topic, podcast_prompts)
-                if audio_files:
-                    print("\n" + "="*50)
-                    print("✅ Podcast audio generation complete!")
-                    print(f"📁 Audio files saved in: output/")
-                    print("="*50)
-            elif method == "2":
-                audio_file = generate_podcast_with_elevenlabs(topic, podcast_prompts)
-                if audio_file:
-                    print("\n" + "="*50)
-                    print("✅ Podcast audio generation complete!")
-                    print(f"📁 Audio file: {audio_file}")
-                    print("="*50)
-    else:
-        print("\n⚠️ ElevenLabs API key not configured. Skipping audio generation.")
-        print("   Add your API key to the 'elevenlabs_api_key' variable to enable audio generation.")
+                if method == "1":
+                    audio_files = generate_segments_and_combine(topic, podcast_prompts, fresh=args.fresh,
+                                                                workspace=workspace)
+                    if audio_files:
+                        print("\n" + "="*50)
+                        print("✅ Podcast audio generation complete!")
+                        print(f"📁 Audio files saved in: {workspace.root}")
+                        print("="*50)
+                elif method == "2":
+                    audio_file = generate_podcast_with_elevenlabs(topic, podcast_prompts, workspace=workspace)
+                    if audio_file:
+                        print("\n" + "="*50)
+                        print("✅ Podcast audio generation complete!")
+                        print(f"📁 Audio file: {audio_file}")
+                        print("="*50)
+        else:
+            print("\n⚠️ ElevenLabs API key not configured. Skipping audio generation.")
+            print("   Add your API key to the 'elevenlabs_api_key' variable to enable audio generation.")
@@ -0,0 +1,122 @@
+"""
+Pre-generate episodes for the app's built-in topic catalog
+
+For every topic in the topics file and every duration, the outline and segment
+scripts (and with --audio, the segment audio) are written into the catalog
+store (CATALOG_DIR, output/catalog by default). build_podcast starts from that
+store whenever it is asked for a catalog topic and duration, so those requests
+skip the LLM and, with audio, most of the TTS work.
+
+Entries that are already complete are skipped, and an interrupted entry resumes
+where it stopped, so the script can run off-peak from cron, e.g.:
+    0 3 * * *  cd /path/to/Scripts && python pregenerate_catalog.py --audio
+
+Usage:
+    python pregenerate_catalog.py                        # scripts for every topic and duration
+    python pregenerate_catalog.py --minutes 30 --audio   # also render 30-minute audio
+    python pregenerate_catalog.py --topics my_topics.txt --refresh
+"""
+
+import os
+import sys
+import time
+import argparse
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import podcast_generator as pg
+
+DEFAULT_TOPICS_FILE = os.path.join(SCRIPT_DIR, "catalog_topics.txt")
+
+
+def load_topics(path):
+    """Topics from a text file: one per line, blank lines and # comments ignored"""
+    topics = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and line not in topics:
+                topics.append(line)
+    return topics
+
+
+def entry_is_ready(workspace, topic, minutes, with_audio):
+    """True if the entry has dialogue (and segment audio, if wanted) for every segment"""
+    manifest = pg.JobManifest.load(workspace.manifest_file)
+    segments = manifest.data.get("segments", [])
+    if not manifest.matches(topic, minutes) or not segments:
+        return False
+    keys = ["dialogue_file", "audio_file"] if with_audio else ["dialogue_file"]
+    if not all(manifest.completed_file(seg["segment"], key) for seg in segments for key in keys):
+        return False
+    # Audio written for another delivery profile doesn't count
+    return not with_audio or all(os.path.splitext(seg["audio_file"])[1] == workspace.audio_extension
+                                 for seg in segments)
+
+
+def pregenerate(topic, minutes, with_audio=False, profile=None, root=pg.CATALOG_DIR, fresh=False):
+    """Write (or finish) the catalog entry for one topic and duration; returns True on success"""
+    workspace = pg.catalog_workspace(topic, minutes, profile, root)
+    podcast_prompts = pg.build_podcast(topic, minutes, fresh=fresh, workspace=workspace)
+    pg.save_podcast(topic, podcast_prompts, workspace=workspace)
+
+    if with_audio:
+        return pg.generate_segments_and_combine(topic, podcast_prompts, fresh=fresh,
+                                                workspace=workspace) is not None
+
+    manifest = pg.JobManifest.load(workspace.manifest_file)
+    with pg.bind_metrics(workspace.metrics):
+        for i, seg in enumerate(podcast_prompts, 1):
+            if pg.generate_segment_script(i, seg, manifest, fresh=fresh, workspace=workspace) is None:
+                manifest.set_status("failed")
+                return False
+    manifest.set_status("scripts")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate catalog episodes into the shared store")
+    parser.add_argument("--topics", default=DEFAULT_TOPICS_FILE, help="file with one topic per line")
+    parser.add_argument("--minutes", type=int, nargs="+", default=pg.CATALOG_MINUTES,
+                        help="episode lengths to pre-generate")
+    parser.add_argument("--audio", action="store_true", help="also render segment audio")
+    parser.add_argument("--profile", choices=sorted(pg.DELIVERY_PROFILES), default=pg.DELIVERY_PROFILE,
+                        help="delivery profile of the pre-rendered audio")
+    parser.add_argument("--catalog-dir", default=pg.CATALOG_DIR, help="catalog store folder")
+    parser.add_argument("--refresh", action="store_true",
+                        help="rewrite entries that already exist (skips the LLM cache)")
+    args = parser.parse_args()
+
+    topics = load_topics(args.topics)
+    jobs = [(topic, minutes) for topic in topics for minutes in args.minutes]
+    print(f"📚 Pre-generating {len(jobs)} catalog entries "
+          f"({len(topics)} topics x {len(args.minutes)} durations) into {args.catalog_dir}")
+
+    done, skipped, failed = 0, 0, []
+    start = time.time()
+    for n, (topic, minutes) in enumerate(jobs, 1):
+        workspace = pg.catalog_workspace(topic, minutes, args.profile, args.catalog_dir)
+        if not args.refresh and entry_is_ready(workspace, topic, minutes, args.audio):
+            skipped += 1
+            continue
+        print(f"\n[{n}/{len(jobs)}] {topic} ({minutes} min)")
+        try:
+            ok = pregenerate(topic, minutes, args.audio, args.profile, args.catalog_dir, args.refresh)
+        except Exception as e:
+            print(f"  ❌ {topic} ({minutes} min): {str(e)}")
+            ok = False
+        if ok:
+            done += 1
+        else:
+            failed.append(f"{topic} ({minutes} min)")
+
+    print(f"\n✅ {done} generated, {skipped} already in the catalog, {len(failed)} failed "
+          f"in {(time.time() - start) / 60:.1f} min")
+    for entry in failed:
+        print(f"   ❌ {entry}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Tests for podcast_generator
+
+Run from the Scripts folder:
+    python -m pytest -q
+"""
+
+import json
+
+import pytest
+
+import podcast_generator as pg
+
+LINES = [
+    {"speaker": "HOST", "text": "Welcome back."},
+    {"speaker": "EXPERT", "text": "Glad to be here."},
+]
+ARRAY = json.dumps(LINES, indent=2)
+
+
+def feed_in_chunks(text, size):
+    """Run text through one parser in chunks of size characters"""
+    parser = pg.JsonArrayStreamParser()
+    objects = []
+    for start in range(0, len(text), size):
+        objects += parser.feed(text[start:start + size])
+    return objects + parser.close()
+
+
+def test_plain_array():
+    assert pg.parse_json_array(ARRAY) == LINES
+
+
+def test_fenced_output_with_chatter():
+    text = f"Sure! Here is the script:\n```json\n{ARRAY}\n```\nLet me know if you need changes."
+    assert pg.parse_json_array(text) == LINES
+
+
+@pytest.mark.parametrize("preamble", [
+    "Here is segment 2 [continuation] as JSON:\n",
+    "[Segment 2] Here you go:\n",
+    "Notes: [] nothing to add. [\n",
+])
+def test_brackets_in_preamble_do_not_end_the_array(preamble):
+    text = f"{preamble}```json\n{ARRAY}\n```"
+    assert pg.parse_json_array(text) == LINES
+    assert pg.parse_dialogue_json(text) == LINES
+
+
+def test_bracketed_preamble_in_outline():
+    outline = [{"segment": 1, "title": "Origins"}, {"segment": 2, "title": "Legacy"}]
+    text = f"Outline [2 segments]:\n```json\n{json.dumps(outline)}\n```"
+    assert pg.parse_json_array(text) == outline
+
+
+def test_text_after_the_array_is_ignored():
+    text = ARRAY + '\n\nAnd one more: {"speaker": "HOST", "text": "Extra"}'
+    assert pg.parse_json_array(text) == LINES
+
+
+def test_trailing_commas():
+    text = '[{"speaker": "HOST", "text": "Welcome back.",}, {"speaker": "EXPERT", "text": "Glad to be here."},]'
+    assert pg.parse_json_array(text) == LINES
+
+
+def test_broken_object_is_skipped():
+    text = '[{"speaker": "HOST", "text": "Welcome back."}, {"speaker": HOST}, {"speaker": "EXPERT", "text": "Glad to be here."}]'
+    assert pg.parse_json_array(text) == LINES
+
+
+def test_truncated_after_last_value_is_salvaged():
+    text = '[{"speaker": "HOST", "text": "Welcome back."}, {"speaker": "EXPERT", "text": "Glad to be here."'
+    assert pg.parse_json_array(text) == LINES
+
+
+def test_truncated_after_trailing_comma_is_salvaged():
+    text = '[{"speaker": "HOST", "text": "Welcome back."}, {"speaker": "EXPERT", "text": "Glad to be here.",'
+    assert pg.parse_json_array(text) == LINES
+
+
+def test_truncated_inside_string_is_dropped():
+    text = '[{"speaker": "HOST", "text": "Welcome back."}, {"speaker": "EXPERT", "text": "Glad to be'
+    assert pg.parse_json_array(text) == LINES[:1]
+
+
+def test_brackets_and_braces_inside_strings():
+    lines = [{"speaker": "HOST", "text": "Arrays look like [1, 2] and objects like {\"a\": 1}."}]
+    assert pg.parse_json_array("```json\n" + json.dumps(lines) + "\n```") == lines
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_chunk_boundaries_do_not_matter(size):
+    text = f"Here is segment 2 [continuation]:\n```json\n{ARRAY}\n```"
+    assert feed_in_chunks(text, size) == LINES
+
+
+def test_escape_split_across_chunks():
+    parser = pg.JsonArrayStreamParser()
+    objects = parser.feed('[{"speaker": "HOST", "text": "She said \\')
+    objects += parser.feed('"hi\\" and left \\\\')
+    objects += parser.feed('"}]')
+    assert objects + parser.close() == [{"speaker": "HOST", "text": 'She said "hi" and left \\'}]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3])
+def test_escapes_at_every_chunk_boundary(size):
+    lines = [{"speaker": "HOST", "text": 'Quote: "x", slash: \\, brace: } bracket: ]'}]
+    assert feed_in_chunks(json.dumps(lines), size) == lines
+
+
+def test_objects_are_returned_as_soon_as_they_close():
+    parser = pg.JsonArrayStreamParser()
+    first, second = ARRAY.split("},", 1)
+    assert parser.feed(first + "},") == LINES[:1]
+    assert parser.feed(second) == LINES[1:]
+    assert parser.close() == []
+
+
+def test_plain_text_fallback():
+    text = "HOST: Welcome back.\nEXPERT: Glad to be here."
+    assert pg.parse_dialogue_json(text) == LINES
+
+
+def tripped_breaker():
+    """A breaker with a window of 2 that two failures have opened"""
+    breaker = pg.CircuitBreaker(window=2, failure_rate=0.5, cooldown=60)
+    tickets = [breaker.allow(), breaker.allow(), breaker.allow()]
+    breaker.record(tickets[0], False)
+    breaker.record(tickets[1], False)
+    assert breaker.state == "open"
+    return breaker, tickets[2]
+
+
+def test_breaker_refuses_while_open():
+    breaker, _ = tripped_breaker()
+    assert breaker.allow() is None
+
+
+def test_breaker_ignores_late_outcomes_while_open():
+    breaker, in_flight = tripped_breaker()
+    breaker.record(in_flight, True)
+    assert breaker.state == "open"
+
+
+def test_breaker_lets_one_trial_through_after_cooldown():
+    breaker, in_flight = tripped_breaker()
+    breaker.opened_at -= 60
+    trial = breaker.allow()
+    assert trial is not None and breaker.allow() is None
+
+    # Requests sent before the breaker opened don't decide the trial
+    breaker.record(in_flight, False)
+    assert breaker.state == "half-open" and breaker.allow() is None
+    breaker.record(trial, True)
+    assert breaker.state == "closed" and breaker.allow() is not None
+
+
+def test_breaker_reopens_when_the_trial_fails():
+    breaker, _ = tripped_breaker()
+    breaker.opened_at -= 60
+    breaker.record(breaker.allow(), False)
+    assert breaker.state == "open" and breaker.allow() is None
+
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417 bytes and 1152 samples a frame
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+
+
+def adts_frame(sample_rate_index=4, payload=b"\x00" * 9):
+    """One AAC-LC mono ADTS frame without CRC (sample rate index 4 = 44.1 kHz)"""
+    length = 7 + len(payload)
+    header = bytes([
+        0xFF, 0xF1,
+        (1 << 6) | (sample_rate_index << 2),
+        (1 << 6) | (length >> 11),
+        (length >> 3) & 0xFF,
+        ((length & 0x07) << 5) | 0x1F,
+        0xFC
+    ])
+    return header + payload
+
+
+def test_mp3_duration_counts_every_frame():
+    assert pg._mp3_duration(MP3_FRAME * 10) == pytest.approx(10 * 1152 / 44100)
+
+
+def test_mp3_duration_skips_the_hls_timestamp_tag():
+    data = MP3_FRAME * 10
+    assert pg._mp3_duration(pg.hls_timestamp_tag(12.5) + data) == pg._mp3_duration(data)
+
+
+def test_mp3_duration_of_other_data_is_unknown():
+    assert pg._mp3_duration(b"OggS" + bytes(500)) is None
+
+
+def test_adts_duration_counts_every_frame():
+    data = adts_frame() * 8
+    assert pg._adts_duration(data) == pytest.approx(8 * 1024 / 44100)
+    assert pg._adts_duration(pg.hls_timestamp_tag(3.0) + data) == pg._adts_duration(data)
+
+
+def test_adts_duration_of_a_bad_frame_is_unknown():
+    assert pg._adts_duration(adts_frame() + b"\x00" * 20) is None
+
+
+def test_vtt_time():
+    assert pg._vtt_time(0) == "00:00:00.000"
+    assert pg._vtt_time(61.2345) == "00:01:01.234"
+    assert pg._vtt_time(3725.5) == "01:02:05.500"
+
+
+def test_cues_of_a_line_split_into_chunks(tmp_path):
+    missing = str(tmp_path / "no_alignment.mp3")
+    placements = [
+        ({"file": missing, "speaker": "HOST", "lines": [0], "texts": ["First half."]}, 0.0, 2.0),
+        ({"file": missing, "speaker": "HOST", "lines": [0], "texts": ["Second half."]}, 2.0, 5.0),
+        ({"file": missing, "speaker": "EXPERT", "lines": [1, 2], "texts": ["Yes.", "Indeed it is."]}, 5.5, 7.0)
+    ]
+    cues = pg.segment_cues(placements)
+    assert [cue["line"] for cue in cues] == [0, 1, 2]
+    assert cues[0]["text"] == "First half. Second half."
+    assert (cues[0]["start"], cues[0]["end"]) == (0.0, 5.0)
+    # Lines batched into one unit share its time in proportion to their length
+    assert cues[1]["start"] == 5.5
+    assert cues[1]["end"] == pytest.approx(5.5 + 1.5 * 4 / 17)
+    assert cues[2]["end"] == pytest.approx(7.0)
+
+
+def test_cues_use_character_timings_offset_by_unit_start(tmp_path):
+    audio = str(tmp_path / "unit.mp3")
+    text = "Hi there"
+    with open(pg.alignment_file_for(audio), "w", encoding="utf-8") as f:
+        json.dump({
+            "characters": list(text),
+            "character_start_times_seconds": [0.1 * k for k in range(len(text))],
+            "character_end_times_seconds": [0.1 * k + 0.1 for k in range(len(text))]
+        }, f)
+    cues = pg.segment_cues([({"file": audio, "speaker": "HOST", "lines": [0], "texts": [text]}, 10.0, 11.0)])
+    words = cues[0]["words"]
+    assert [word[2] for word in words] == ["Hi", "there"]
+    assert words[0][:2] == pytest.approx([10.0, 10.2])
+    assert words[1][:2] == pytest.approx([10.3, 10.8])
+    assert (cues[0]["start"], cues[0]["end"]) == (words[0][0], words[1][1])
+
+
+def test_split_text_keeps_short_text_whole():
+    assert pg.split_text_into_chunks("Short line.", max_chars=50) == ["Short line."]
+    assert pg.split_text_into_chunks("x" * 500, max_chars=0) == ["x" * 500]
+
+
+def test_split_text_at_sentences_then_clauses_then_words():
+    text = "One two. Three four five, six seven; eight. Nine."
+    chunks = pg.split_text_into_chunks(text, max_chars=20)
+    assert chunks == ["One two.", "Three four five,", "six seven; eight.", "Nine."]
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert pg.split_text_into_chunks("abcdefgh ijklmnop qrstuvwx", max_chars=10) == \
+        ["abcdefgh", "ijklmnop", "qrstuvwx"]
+
+
+def test_rolling_summary_lists_recent_goals_and_older_titles():
+    covered = [(f"Title {n}", f"Goal {n}") for n in range(1, 6)]
+    assert pg.rolling_summary(covered, recent=2, max_chars=1000) == (
+        "- Segments 1-3: Title 1; Title 2; Title 3\n"
+        "- Segment 4: Goal 4\n"
+        "- Segment 5: Goal 5"
+    )
+
+
+def test_rolling_summary_keeps_the_latest_titles_within_max_chars():
+    covered = [(f"Title {n}", f"Goal {n}") for n in range(1, 6)]
+    first = pg.rolling_summary(covered, recent=1, max_chars=18).splitlines()[0]
+    assert first == "- Segments 1-4: …Title 3; Title 4"
+
+
+def test_rolling_summary_of_nothing():
+    assert pg.rolling_summary([], recent=2) == ""